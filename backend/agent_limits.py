@@ -0,0 +1,266 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+# The rolling spend window is split into this many slots, so each agent's
+# spend state is a fixed-size structure no matter how many payments it makes.
+SPEND_SLOTS = 60
+
+
+class AgentLimitState:
+    """
+    Token bucket + slotted rolling spend window for one agent.
+    Times are unix seconds so the state can be persisted and reloaded.
+    """
+
+    __slots__ = ("tokens", "bucket_at", "spend_window", "slots", "dirty")
+
+    def __init__(self, tokens: Optional[float] = None, bucket_at: float = 0.0,
+                 spend_window: int = 0, slots: Optional[Dict[int, int]] = None):
+        self.tokens = tokens
+        self.bucket_at = bucket_at
+        self.spend_window = spend_window
+        # absolute slot number -> lovelace spent in that slot
+        self.slots: Dict[int, int] = dict(slots or {})
+        self.dirty = False
+
+    # ---------- token bucket ----------
+
+    def take_token(self, rate_per_minute: int, burst: int, now: float) -> Optional[float]:
+        """Consumes one token; returns seconds to wait instead if empty."""
+        rate = rate_per_minute / 60.0
+        if self.tokens is None:
+            self.tokens = float(burst)
+        else:
+            elapsed = max(0.0, now - self.bucket_at)
+            self.tokens = min(float(burst), self.tokens + elapsed * rate)
+        self.bucket_at = now
+
+        if self.tokens < 1.0:
+            return (1.0 - self.tokens) / rate
+        self.tokens -= 1.0
+        return None
+
+    # ---------- rolling spend ----------
+
+    def _slot_len(self) -> float:
+        return self.spend_window / SPEND_SLOTS
+
+    def _expire(self, now: float) -> int:
+        current = int(now // self._slot_len())
+        oldest = current - SPEND_SLOTS + 1
+        for slot in [s for s in self.slots if s < oldest]:
+            del self.slots[slot]
+        return current
+
+    def check_spend(self, cap: int, window: int, amount: int, now: float) -> Optional[float]:
+        """
+        Checks amount against the rolling cap; returns seconds until enough
+        old spend expires when over the cap. Does not record anything.
+        Raises ValueError for an amount no wait could ever admit.
+        """
+        if amount <= 0:
+            raise ValueError("amount must be positive")
+        if amount > cap:
+            raise ValueError("amount exceeds spend cap")
+        if window != self.spend_window:
+            # window changed on the Agent row: start a fresh window
+            self.spend_window = window
+            self.slots = {}
+
+        self._expire(now)
+        excess = sum(self.slots.values()) + amount - cap
+        if excess <= 0:
+            return None
+
+        freed = 0
+        for slot in sorted(self.slots):
+            freed += self.slots[slot]
+            if freed >= excess:
+                expires_at = (slot + SPEND_SLOTS) * self._slot_len()
+                return max(0.0, expires_at - now)
+        return float(window)
+
+    def record_spend(self, amount: int, now: float) -> None:
+        if amount <= 0:
+            raise ValueError("amount must be positive")
+        current = self._expire(now)
+        self.slots[current] = self.slots.get(current, 0) + amount
+
+    def unrecord_spend(self, amount: int) -> None:
+        """Takes back spend recorded by record_spend (newest slots first)."""
+        for slot in sorted(self.slots, reverse=True):
+            taken = min(amount, self.slots[slot])
+            self.slots[slot] -= taken
+            amount -= taken
+            if not self.slots[slot]:
+                del self.slots[slot]
+            if amount <= 0:
+                break
+
+
+class AgentLimiter:
+    """
+    Enforces per-agent request rate and rolling lovelace spend caps in
+    memory. At most `max_agents` states are kept (least recently used are
+    evicted). Changed states are handed to `save` every `persist_seconds`,
+    and `load` restores a state the first time an agent is seen.
+    """
+
+    def __init__(
+        self,
+        load: Callable[[int], Optional[AgentLimitState]],
+        save: Callable[[Dict[int, AgentLimitState]], None],
+        max_agents: int = 10_000,
+        persist_seconds: float = 10.0,
+    ):
+        self.load = load
+        self.save = save
+        self.max_agents = max_agents
+        self.persist_seconds = persist_seconds
+
+        self._lock = threading.Lock()
+        self._states: "OrderedDict[int, AgentLimitState]" = OrderedDict()
+        # dirty states evicted since the last persist (saved off the hot path)
+        self._evicted: Dict[int, AgentLimitState] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _cached(self, agent_id: int) -> Optional[AgentLimitState]:
+        # callers hold self._lock
+        state = self._states.get(agent_id)
+        if state is not None:
+            self._states.move_to_end(agent_id)
+            return state
+        state = self._evicted.pop(agent_id, None)
+        if state is not None:
+            self._insert(agent_id, state)
+        return state
+
+    def _insert(self, agent_id: int, state: AgentLimitState) -> None:
+        # callers hold self._lock
+        self._states[agent_id] = state
+        while len(self._states) > self.max_agents:
+            evicted_id, evicted = self._states.popitem(last=False)
+            if evicted.dirty:
+                self._evicted[evicted_id] = evicted
+
+    def check(
+        self,
+        agent_id: int,
+        amount: int,
+        rate_per_minute: Optional[int] = None,
+        burst: Optional[int] = None,
+        spend_cap: Optional[int] = None,
+        spend_window: Optional[int] = None,
+        now: Optional[float] = None,
+    ) -> Optional[int]:
+        """
+        Admits one payment of `amount` lovelace, or returns the Retry-After
+        seconds when the agent is over its rate limit or spend cap.
+        Raises ValueError for a non-positive amount or one above the cap.
+        Agents without limits are not tracked at all.
+        """
+        if not rate_per_minute and not spend_cap:
+            return None
+        now = time.time() if now is None else now
+
+        loaded = None
+        while True:
+            with self._lock:
+                state = self._cached(agent_id)
+                if state is None and loaded is not None:
+                    state = loaded
+                    self._insert(agent_id, state)
+                if state is not None:
+                    return self._admit(
+                        state, amount, rate_per_minute, burst, spend_cap, spend_window, now
+                    )
+            # first time this agent is seen: hit the DB without the lock, so
+            # one agent's load never stalls every other agent's check
+            loaded = self.load(agent_id) or AgentLimitState()
+
+    @staticmethod
+    def _admit(state, amount, rate_per_minute, burst, spend_cap, spend_window, now) -> Optional[int]:
+        # callers hold self._lock
+        if spend_cap:
+            wait = state.check_spend(spend_cap, spend_window or 86400, amount, now)
+            if wait is not None:
+                return max(1, math.ceil(wait))
+
+        if rate_per_minute:
+            wait = state.take_token(rate_per_minute, burst or rate_per_minute, now)
+            state.dirty = True
+            if wait is not None:
+                return max(1, math.ceil(wait))
+
+        if spend_cap:
+            state.record_spend(amount, now)
+        state.dirty = True
+        return None
+
+    def refund(
+        self,
+        agent_id: int,
+        amount: int,
+        rate_per_minute: Optional[int] = None,
+        burst: Optional[int] = None,
+        spend_cap: Optional[int] = None,
+        spend_window: Optional[int] = None,
+    ) -> None:
+        """
+        Gives back the token and spend of a payment admitted by check()
+        that was then not recorded (e.g. the write failed).
+        """
+        if not rate_per_minute and not spend_cap:
+            return
+        with self._lock:
+            state = self._states.get(agent_id) or self._evicted.get(agent_id)
+            if state is None:
+                return
+            if rate_per_minute and state.tokens is not None:
+                state.tokens = min(float(burst or rate_per_minute), state.tokens + 1.0)
+            if spend_cap:
+                state.unrecord_spend(amount)
+            state.dirty = True
+
+    def persist(self) -> int:
+        with self._lock:
+            dirty = {i: s for i, s in self._states.items() if s.dirty}
+            dirty.update(self._evicted)
+            self._evicted = {}
+            for state in dirty.values():
+                state.dirty = False
+        if dirty:
+            try:
+                self.save(dirty)
+            except Exception:
+                with self._lock:
+                    for agent_id, state in dirty.items():
+                        state.dirty = True
+                        if agent_id not in self._states:
+                            self._evicted.setdefault(agent_id, state)
+                raise
+        return len(dirty)
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="agent-limiter", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread = None
+        self.persist()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.persist_seconds):
+            try:
+                self.persist()
+            except Exception as e:
+                print("[AgentLimiter] persist failed:", e)
+
@@ -0,0 +1,358 @@
+import bisect
+import gzip
+import hashlib
+import heapq
+import json
+import mmap
+import os
+import struct
+import threading
+from datetime import datetime
+from functools import lru_cache
+from types import SimpleNamespace
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+MERCHANT_BUCKETS = int(os.getenv("ARCHIVE_MERCHANT_BUCKETS", "16"))
+# decoded partitions kept in memory (each up to one archival batch of rows)
+PARTITION_CACHE_SIZE = int(os.getenv("ARCHIVE_PARTITION_CACHE_SIZE", "8"))
+
+MANIFEST_NAME = "manifest.json"
+
+# Columns with an on-disk key -> partition index, per archived table.
+# An index added later covers partitions from its first write on (see
+# "index_start" in the manifest); older partitions are always scanned.
+INDEXED_COLUMNS = {
+    "payment_receipts": ("tx_hash", "payer_address", "merchant_address"),
+    "agent_payments": ("agent_id", "merchant_address", "tx_hash"),
+}
+
+# index record: 8-byte blake2b digest of the value + uint32 partition number
+_INDEX_RECORD = struct.Struct(">8sI")
+
+
+def merchant_bucket(merchant_address: str) -> int:
+    digest = hashlib.sha1(merchant_address.encode("utf-8")).digest()
+    return int.from_bytes(digest[:4], "big") % MERCHANT_BUCKETS
+
+
+def month_key(created_at) -> str:
+    if created_at is None:
+        return "undated"
+    if isinstance(created_at, str):
+        created_at = datetime.fromisoformat(created_at)
+    return created_at.strftime("%Y-%m")
+
+
+def partition_key(row: dict) -> Tuple[int, str]:
+    """(merchant bucket, month) of the partition an archived row goes to."""
+    return merchant_bucket(row["merchant_address"]), month_key(row.get("created_at"))
+
+
+def _key_digest(value) -> bytes:
+    return hashlib.blake2b(str(value).encode("utf-8"), digest_size=8).digest()
+
+
+def _index_name(table: str, column: str) -> str:
+    return f"{table}.{column}"
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+@lru_cache(maxsize=PARTITION_CACHE_SIZE)
+def _load_partition(path: str) -> Dict[str, list]:
+    # partition files are immutable once written, so caching by path is safe
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return json.load(f)["data"]
+
+
+class ColdArchive:
+    """
+    Local cold storage for rows moved out of the hot tables.
+
+    Layout under root:
+      manifest.json                                  partitions + index segments
+      <table>/bucket=NN/month=YYYY-MM/part-XXXXX.json.gz
+      index/<table>.<column>/seg-XXXXXX.bin          sorted key -> partition
+
+    Each part file is columnar (one array per column) and gzip-compressed.
+    Lookups on an INDEXED_COLUMNS column (merchant_address included) only
+    decode the partitions the index points at.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self._lock = threading.Lock()
+        self._manifest = None
+        self._manifest_mtime = None
+
+    # ---------- manifest ----------
+
+    def _path(self, *parts: str) -> str:
+        return os.path.join(self.root, *parts)
+
+    def manifest(self) -> dict:
+        """
+        Returns the manifest, reloading it when another process
+        (the archival job) has rewritten it.
+        """
+        path = self._path(MANIFEST_NAME)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return {"version": 2, "partitions": [], "indexes": {}}
+
+        with self._lock:
+            if self._manifest is None or mtime != self._manifest_mtime:
+                with open(path, "r", encoding="utf-8") as f:
+                    self._manifest = json.load(f)
+                self._manifest_mtime = mtime
+            return self._manifest
+
+    def _write_atomic(self, name: str, data: bytes) -> None:
+        path = self._path(name)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    # ---------- writes ----------
+
+    def write_rows(self, table: str, rows: List[dict]) -> int:
+        """
+        Append rows (dicts with at least id + merchant_address) to the
+        archive as new partition files, then update manifest + indexes.
+        Every call writes one file per (bucket, month) it touches, so
+        callers should pass large batches (archive_receipts.py buffers
+        rows per partition for this).
+        """
+        if not rows:
+            return 0
+
+        groups: Dict[Tuple[int, str], List[dict]] = {}
+        for row in rows:
+            groups.setdefault(partition_key(row), []).append(row)
+
+        manifest = json.loads(json.dumps(self.manifest()))
+        manifest["version"] = 2
+        partitions = manifest["partitions"]
+        indexed = INDEXED_COLUMNS.get(table, ())
+        new_records: Dict[str, Set[Tuple[bytes, int]]] = {
+            _index_name(table, column): set() for column in indexed
+        }
+        index_start = manifest.setdefault("index_start", {})
+        for name in new_records:
+            if name not in manifest.get("indexes", {}) and name not in index_start:
+                # a column indexed after partitions were already written
+                index_start[name] = len(partitions)
+
+        for (bucket, month), group in sorted(groups.items()):
+            columns = list(group[0].keys())
+            data = {col: [_encode(r[col]) for r in group] for col in columns}
+
+            rel_dir = os.path.join(table, f"bucket={bucket:02d}", f"month={month}")
+            os.makedirs(self._path(rel_dir), exist_ok=True)
+            part_no = len(partitions)
+            rel_path = os.path.join(rel_dir, f"part-{part_no:05d}.json.gz")
+
+            with gzip.open(self._path(rel_path), "wt", encoding="utf-8") as f:
+                json.dump({"columns": columns, "data": data}, f, separators=(",", ":"))
+
+            ids = data["id"]
+            partitions.append(
+                {
+                    "table": table,
+                    "bucket": bucket,
+                    "month": month,
+                    "path": rel_path,
+                    "rows": len(group),
+                    "min_id": min(ids),
+                    "max_id": max(ids),
+                }
+            )
+
+            for column in indexed:
+                records = new_records[_index_name(table, column)]
+                for value in data[column]:
+                    if value is not None:
+                        records.add((_key_digest(value), part_no))
+
+        obsolete = []
+        for name, records in new_records.items():
+            if records:
+                obsolete += self._add_segment(manifest, name, sorted(records))
+
+        self._write_atomic(MANIFEST_NAME, json.dumps(manifest, indent=1).encode("utf-8"))
+        # merged-away segments go only after the manifest stops listing them
+        for rel_path in obsolete:
+            try:
+                os.remove(self._path(rel_path))
+            except FileNotFoundError:
+                pass
+        return len(rows)
+
+    def _write_segment(
+        self, manifest: dict, name: str, records: Iterable[Tuple[bytes, int]]
+    ) -> Tuple[str, int]:
+        seg_no = manifest.get("next_segment", 0)
+        manifest["next_segment"] = seg_no + 1
+        rel_path = os.path.join("index", name, f"seg-{seg_no:06d}.bin")
+        os.makedirs(self._path("index", name), exist_ok=True)
+
+        path = self._path(rel_path)
+        tmp = path + ".tmp"
+        count = 0
+        with open(tmp, "wb") as out:
+            for record in records:
+                out.write(_INDEX_RECORD.pack(*record))
+                count += 1
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp, path)
+        return rel_path, count
+
+    def _iter_segment(self, rel_path: str) -> Iterator[Tuple[bytes, int]]:
+        with open(self._path(rel_path), "rb") as f:
+            while True:
+                chunk = f.read(_INDEX_RECORD.size * 4096)
+                if not chunk:
+                    break
+                yield from _INDEX_RECORD.iter_unpack(chunk)
+
+    def _add_segment(self, manifest: dict, name: str, records: List[Tuple[bytes, int]]) -> List[str]:
+        """
+        Adds one batch's sorted records as a new index segment. Segments
+        are merged like a binary counter (while the previous one is no
+        larger than the newest), so each record is rewritten O(log n)
+        times over a run and a lookup probes O(log n) segments.
+        Returns the merged-away segment paths.
+        """
+        segments = manifest.setdefault("indexes", {}).setdefault(name, [])
+        path, count = self._write_segment(manifest, name, records)
+        segments.append({"path": path, "records": count})
+
+        obsolete = []
+        while len(segments) >= 2 and segments[-2]["records"] <= segments[-1]["records"]:
+            newer = segments.pop()
+            older = segments.pop()
+            merged = heapq.merge(self._iter_segment(older["path"]), self._iter_segment(newer["path"]))
+            path, count = self._write_segment(manifest, name, merged)
+            segments.append({"path": path, "records": count})
+            obsolete += [older["path"], newer["path"]]
+        return obsolete
+
+    # ---------- reads ----------
+
+    def _partitions(self, table: str, merchant_address: Optional[str] = None) -> List[Tuple[int, dict]]:
+        parts = [
+            (part_no, p)
+            for part_no, p in enumerate(self.manifest()["partitions"])
+            if p["table"] == table
+        ]
+        if merchant_address is not None:
+            bucket = merchant_bucket(merchant_address)
+            parts = [(n, p) for n, p in parts if p["bucket"] == bucket]
+        return parts
+
+    def _rows(self, partition: dict) -> Iterator[dict]:
+        data = _load_partition(self._path(partition["path"]))
+        columns = list(data.keys())
+        for values in zip(*(data[c] for c in columns)):
+            yield dict(zip(columns, values))
+
+    def _indexed_partitions(self, table: str, column: str, value) -> Optional[Set[int]]:
+        """
+        Partition numbers that may hold rows with column == value, or
+        None when the column has no index.
+        """
+        if column not in INDEXED_COLUMNS.get(table, ()):
+            return None
+        name = _index_name(table, column)
+        digest = _key_digest(value)
+
+        for attempt in range(3):
+            manifest = self.manifest()
+            segments = manifest.get("indexes", {}).get(name, [])
+            try:
+                # partitions written before the index existed may match too
+                found = set(range(manifest.get("index_start", {}).get(name, 0)))
+                for segment in segments:
+                    found.update(self._probe_segment(segment["path"], digest))
+                return found
+            except FileNotFoundError:
+                # the archival job merged this segment away after we read
+                # the manifest; the rewritten manifest lists its successor
+                if attempt == 2:
+                    raise
+
+    def _probe_segment(self, rel_path: str, digest: bytes) -> Iterator[int]:
+        with open(self._path(rel_path), "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                keys = _DigestView(mm)
+                i = bisect.bisect_left(keys, digest)
+                while i < len(keys) and keys[i] == digest:
+                    yield _INDEX_RECORD.unpack_from(mm, i * _INDEX_RECORD.size)[1]
+                    i += 1
+
+    def scan(self, table: str, merchant_address: Optional[str] = None, **equals) -> Iterator[dict]:
+        """
+        Yields archived rows of `table` matching all column == value filters.
+        Indexed columns and merchant_address narrow the partitions decoded.
+        """
+        parts = self._partitions(table, merchant_address)
+        if merchant_address is not None:
+            equals["merchant_address"] = merchant_address
+        for column, value in equals.items():
+            candidates = self._indexed_partitions(table, column, value)
+            if candidates is not None:
+                parts = [(n, p) for n, p in parts if n in candidates]
+
+        for _, partition in parts:
+            for row in self._rows(partition):
+                if all(row.get(k) == v for k, v in equals.items()):
+                    yield row
+
+    def lookup_tx_hash(self, tx_hash: str) -> Optional[dict]:
+        """
+        Finds an archived payment receipt by tx_hash via the on-disk index.
+        Only the matching partition is decoded.
+        """
+        return next(self.scan("payment_receipts", tx_hash=tx_hash), None)
+
+
+class _DigestView:
+    """Sequence view over the digests in an mmapped tx index (for bisect)."""
+
+    def __init__(self, mm: mmap.mmap):
+        self._mm = mm
+        self._n = len(mm) // _INDEX_RECORD.size
+
+    def __len__(self) -> int:
+        return self._n
+
+    def __getitem__(self, i: int) -> bytes:
+        start = i * _INDEX_RECORD.size
+        return self._mm[start:start + 8]
+
+
+def merge_with_archived(hot_rows: Iterable, archived_rows: Iterable[dict], key: str = "id") -> list:
+    """
+    Combines hot ORM rows with archived dict rows, newest id first.
+    Rows present twice (a job interrupted between writing the archive and
+    deleting, then re-run) are kept once, matched on `key`.
+    """
+    merged = list(hot_rows)
+    seen = {getattr(r, key) for r in merged}
+    for row in archived_rows:
+        if row[key] not in seen:
+            seen.add(row[key])
+            merged.append(SimpleNamespace(**row))
+    merged.sort(key=lambda r: r.id, reverse=True)
+    return merged
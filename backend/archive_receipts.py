@@ -0,0 +1,142 @@
+import argparse
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func, or_
+
+from archive import partition_key
+from main import (
+    SessionLocal,
+    shard_router,
+    PaymentReceipt,
+    AgentPayment,
+    cold_archive,
+)
+
+
+ARCHIVED_MODELS = [PaymentReceipt, AgentPayment]
+
+
+def archive_table(
+    model,
+    make_session,
+    before_id: Optional[int] = None,
+    before_time: Optional[datetime] = None,
+    batch_size: int = 50_000,
+) -> int:
+    """
+    Moves rows of `model` matching the cutoff into cold storage: write
+    partition files + index first, then delete from the hot table. Reads
+    skip duplicates if a run dies in between.
+
+    Rows are buffered per (merchant bucket, month) and a partition is
+    written once it holds batch_size rows, once the scan (in id, i.e.
+    roughly time, order) has moved past its month, or at the end of the
+    run, so one run does not leave a small file per bucket per batch.
+    Each run still starts new part files, so frequent small runs (e.g.
+    hourly) leave smaller partitions than one daily run.
+
+    The newest row always stays hot: SQLite hands out max(id) + 1 for
+    tables without AUTOINCREMENT, so deleting it would let new rows reuse
+    archived ids.
+    """
+    table = model.__tablename__
+    columns = [c.name for c in model.__table__.columns]
+
+    cutoffs = []
+    if before_id is not None:
+        cutoffs.append(model.id < before_id)
+    if before_time is not None:
+        cutoffs.append(model.created_at < before_time)
+    if not cutoffs:
+        raise ValueError("need before_id and/or before_time")
+
+    total = 0
+    buffered: Dict[Tuple[int, str], List[dict]] = {}
+    db = make_session()
+
+    def write(keys) -> None:
+        nonlocal total
+        rows = [row for key in keys for row in buffered.pop(key)]
+        cold_archive.write_rows(table, rows)
+
+        ids = [r["id"] for r in rows]
+        for start in range(0, len(ids), 1000):
+            db.query(model).filter(model.id.in_(ids[start:start + 1000])).delete(
+                synchronize_session=False
+            )
+        db.commit()
+
+        total += len(rows)
+        print(f"  {table}: archived {total} rows")
+
+    try:
+        max_id = db.query(func.max(model.id)).scalar()
+        if max_id is None:
+            return 0
+        last_id = None
+        while True:
+            query = db.query(model.__table__).filter(or_(*cutoffs), model.id < max_id)
+            if last_id is not None:
+                # buffered rows are still in the table
+                query = query.filter(model.id > last_id)
+            batch = query.order_by(model.id).limit(batch_size).all()
+            if not batch:
+                break
+            last_id = batch[-1].id
+
+            months = set()
+            for r in batch:
+                row = dict(zip(columns, r))
+                key = partition_key(row)
+                buffered.setdefault(key, []).append(row)
+                months.add(key[1])
+
+            oldest = min(months)
+            done = [
+                key for key, rows in buffered.items()
+                if len(rows) >= batch_size or key[1] < oldest
+            ]
+            kept = sum(len(rows) for key, rows in buffered.items() if key not in done)
+            if kept > 4 * batch_size:
+                # ids far out of month order: bound memory instead
+                done = list(buffered)
+            if done:
+                write(done)
+
+        if buffered:
+            write(list(buffered))
+    finally:
+        db.close()
+
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Move old payment receipts / agent payments into cold storage."
+    )
+    parser.add_argument("--before-id", type=int, help="archive rows with id < this")
+    parser.add_argument("--older-than-days", type=int, help="archive rows older than N days")
+    parser.add_argument("--batch-size", type=int, default=50_000)
+    args = parser.parse_args()
+
+    if args.before_id is None and args.older_than_days is None:
+        parser.error("give --before-id and/or --older-than-days")
+
+    before_time = None
+    if args.older_than_days is not None:
+        before_time = datetime.utcnow() - timedelta(days=args.older_than_days)
+
+    # with sharding enabled the archived tables live in the shard databases
+    session_makers = shard_router.sessionmakers if shard_router else [SessionLocal]
+
+    print(f"Archiving into {cold_archive.root} ...")
+    for make_session in session_makers:
+        for model in ARCHIVED_MODELS:
+            archive_table(model, make_session, args.before_id, before_time, args.batch_size)
+    print("Archival complete.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import argparse
+
+from sqlalchemy import bindparam, update
+
+from main import (
+    SessionLocal,
+    shard_router,
+    PaymentReceipt,
+    price_feed,
+)
+from price_feed import to_unix
+
+
+def backfill_fiat(make_session, chunk_size: int = 20_000) -> int:
+    """
+    Fills payment_receipts.fiat_value_usd where it is NULL, walking the
+    table by id in chunks: one SELECT, one bulk price lookup and one
+    executemany UPDATE per chunk. Rows without created_at are skipped.
+    """
+    table = PaymentReceipt.__table__
+    stmt = (
+        update(table)
+        .where(table.c.id == bindparam("b_id"))
+        .values(fiat_value_usd=bindparam("b_usd"))
+    )
+
+    total = 0
+    last_id = 0
+    db = make_session()
+    try:
+        while True:
+            rows = (
+                db.query(table.c.id, table.c.created_at, table.c.amount_lovelace)
+                .filter(
+                    table.c.id > last_id,
+                    table.c.fiat_value_usd.is_(None),
+                    table.c.created_at.isnot(None),
+                )
+                .order_by(table.c.id)
+                .limit(chunk_size)
+                .all()
+            )
+            if not rows:
+                break
+
+            prices = price_feed.series.prices_at([to_unix(r.created_at) for r in rows])
+            params = [
+                {"b_id": r.id, "b_usd": r.amount_lovelace / 1_000_000 * p}
+                for r, p in zip(rows, prices)
+                if p is not None
+            ]
+            if params:
+                db.connection().execute(stmt, params)
+            db.commit()
+
+            last_id = rows[-1].id
+            total += len(params)
+            print(f"  valued {total} receipts (up to id {last_id})")
+    finally:
+        db.close()
+
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Backfill fiat_value_usd on payment receipts from ADA_PRICE_SOURCE."
+    )
+    parser.add_argument("--chunk-size", type=int, default=20_000)
+    args = parser.parse_args()
+
+    price_feed.refresh()
+    if not len(price_feed.series):
+        parser.error("no price data: set ADA_PRICE_SOURCE to a CSV path or URL")
+
+    session_makers = shard_router.sessionmakers if shard_router else [SessionLocal]
+    for make_session in session_makers:
+        backfill_fiat(make_session, args.chunk_size)
+    print("Backfill complete.")
+
+
+if __name__ == "__main__":
+    main()
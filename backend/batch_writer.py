@@ -0,0 +1,120 @@
+import threading
+import time
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple, TypeVar
+
+from sqlalchemy import Table, insert
+from sqlalchemy.engine import Engine
+
+T = TypeVar("T")
+
+
+class BatchWriter:
+    """
+    Buffers rows for one table and writes them with a single executemany
+    INSERT once `max_batch` rows are queued, or every `flush_seconds`
+    from a background thread.
+
+    Rows stay visible to readers through read_consistent() until they
+    are committed, so buffered writes are never lost or counted twice.
+    With `stamp_column`, each write attempt sets that column to the
+    current time, so it tracks when a row reached the database.
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        table: Table,
+        max_batch: int = 200,
+        flush_seconds: float = 1.0,
+        stamp_column: Optional[str] = None,
+    ):
+        self.engine = engine
+        self.table = table
+        self.max_batch = max(1, max_batch)
+        self.flush_seconds = flush_seconds
+        self.stamp_column = stamp_column
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._buffer: List[dict] = []
+        self._inflight: List[dict] = []
+        # odd while a flush is committing (seqlock-style)
+        self._seq = 0
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, row: dict) -> None:
+        with self._lock:
+            self._buffer.append(row)
+            full = len(self._buffer) >= self.max_batch
+        if full:
+            self.flush()
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            with self._lock:
+                if not self._buffer:
+                    return 0
+                self._inflight, self._buffer = self._buffer, []
+                self._seq += 1
+            rows = self._inflight
+            if self.stamp_column is not None:
+                stamp = datetime.utcnow()
+                for row in rows:
+                    row[self.stamp_column] = stamp
+            try:
+                with self.engine.begin() as conn:
+                    conn.execute(insert(self.table), rows)
+            except Exception:
+                # put the rows back so the next flush retries them
+                with self._lock:
+                    self._buffer = rows + self._buffer
+                    self._inflight = []
+                    self._seq += 1
+                raise
+            with self._lock:
+                self._inflight = []
+                self._seq += 1
+            return len(rows)
+
+    def read_consistent(
+        self, read_db: Callable[[], T], match: Callable[[dict], bool]
+    ) -> Tuple[T, List[dict]]:
+        """
+        Runs read_db() and returns its result together with the buffered
+        rows matching `match`, retrying if a flush committed in between.
+        """
+        while True:
+            with self._lock:
+                seq = self._seq
+                pending = [r for r in self._buffer if match(r)]
+            if seq % 2:
+                time.sleep(0.001)
+                continue
+            result = read_db()
+            with self._lock:
+                if self._seq == seq:
+                    return result, pending
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name=f"batch-writer-{self.table.name}", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread = None
+        self.flush()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_seconds):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[BatchWriter:{self.table.name}] flush failed:", e)
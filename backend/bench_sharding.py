@@ -0,0 +1,134 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Runs in a fresh interpreter (main reads the shard URLs at import):
+# creates the schema, then forks `workers` processes (like uvicorn
+# workers, so the GIL is not the bottleneck) that each create `writes`
+# invoices for random merchants through the create_invoice endpoint
+# function. Prints invoices written per second, the rows written to
+# each database file (SQLite serialises writers per file) and the number
+# of directory claims committed apart from their invoice (a second commit).
+WRITE_SNIPPET = r"""
+import json, multiprocessing, random, sys, time
+from sqlalchemy import func, inspect, select
+import main
+
+workers, writes = int(sys.argv[1]), int(sys.argv[2])
+main.migrate_all()
+
+def worker(n):
+    # connections opened by migrate_all() belong to the parent
+    for engine in [main.engine] + (main.shard_router.engines if main.shard_router else []):
+        engine.dispose(close=False)
+    rng = random.Random(n)
+    for i in range(writes):
+        db = main.SessionLocal()
+        shards = main.ShardSessions(main.shard_router, db)
+        try:
+            main.create_invoice(
+                main.InvoiceCreate(
+                    invoice_id=f"BENCH-{n}-{i}",
+                    merchant_address=f"addr_test1_bench_merchant{rng.randrange(1000)}",
+                    amount_lovelace=1_000_000,
+                    description="bench invoice",
+                ),
+                shards,
+            )
+        finally:
+            shards.close()
+            db.close()
+
+ctx = multiprocessing.get_context("fork")
+procs = [ctx.Process(target=worker, args=(n,)) for n in range(workers)]
+t0 = time.perf_counter()
+for p in procs:
+    p.start()
+for p in procs:
+    p.join()
+elapsed = time.perf_counter() - t0
+assert all(p.exitcode == 0 for p in procs), "a worker failed"
+
+rows_per_file = []
+split_claims = 0
+shard_engines = main.shard_router.engines if main.shard_router else []
+for engine in [main.engine] + shard_engines:
+    with engine.connect() as conn:
+        rows_per_file.append(sum(
+            conn.execute(select(func.count()).select_from(table)).scalar()
+            for table in (main.InvoiceNFT.__table__, main.ShardDirectory.__table__)
+            if inspect(conn).has_table(table.name)
+        ))
+for i, engine in enumerate(shard_engines):
+    with engine.connect() as conn:
+        directory = main.ShardDirectory.__table__
+        split_claims += conn.execute(
+            select(func.count()).select_from(directory).where(directory.c.shard != i)
+        ).scalar()
+print(json.dumps({
+    "rate": workers * writes / elapsed,
+    "rows_per_file": rows_per_file,
+    "commits_per_write": 1 + split_claims / (workers * writes),
+}))
+"""
+
+
+def run_writes(shards: int, workers: int, writes: int, directory=None) -> dict:
+    """
+    Invoice write throughput with `shards` SQLite shard files
+    (0 = sharding disabled, everything in the main database).
+    """
+    with tempfile.TemporaryDirectory(prefix="vibechain-shards-", dir=directory) as tmp:
+        env = dict(os.environ)
+        env.setdefault("BLOCKFROST_PROJECT_ID_PREVIEW", "bench")
+        env["DATABASE_URL"] = f"sqlite:///{tmp}/main.db"
+        env["SHARD_DATABASE_URLS"] = ",".join(
+            f"sqlite:///{tmp}/shard{i}.db" for i in range(shards)
+        )
+        proc = subprocess.run(
+            [sys.executable, "-c", WRITE_SNIPPET, str(workers), str(writes)],
+            cwd=HERE,
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure invoice write throughput against N SQLite shard files."
+    )
+    parser.add_argument("--shards", default="0,1,2,4,8", help="comma-separated shard counts")
+    parser.add_argument("--workers", type=int, default=8, help="writer processes")
+    parser.add_argument("--writes", type=int, default=200, help="invoices per worker")
+    parser.add_argument("--dir", help="where to create the database files (default: temp dir)")
+    args = parser.parse_args()
+
+    print(f"{args.workers} writer processes on {os.cpu_count()} CPU(s)")
+    print("busiest file = share of all row writes landing on one database file,")
+    print("which bounds throughput once the disk (not the CPU) is the limit;")
+    print("with fewer CPUs than writers the run is CPU-bound and the extra")
+    print("directory commit of a key owned by another shard shows as a slowdown")
+    baseline = None
+    for n in (int(s) for s in args.shards.split(",")):
+        result = run_writes(n, args.workers, args.writes, args.dir)
+        rate = result["rate"]
+        baseline = baseline or rate
+        busiest = max(result["rows_per_file"]) / sum(result["rows_per_file"])
+        label = "unsharded" if n == 0 else f"{n} shard(s)"
+        print(
+            f"{label:>12}: {rate:8.0f} writes/s ({rate / baseline:.2f}x)"
+            f"  busiest file {busiest:6.1%}"
+            f"  commits/write {result['commits_per_write']:.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# ~1.5x the measured median on a dev machine (~540 ms import, ~540 ms to
+# first request including lifespan startup); override per machine with
+# the env vars below
+IMPORT_BUDGET_MS = float(os.getenv("STARTUP_IMPORT_BUDGET_MS", "800"))
+FIRST_REQUEST_BUDGET_MS = float(os.getenv("STARTUP_FIRST_REQUEST_BUDGET_MS", "800"))
+
+# Imports main, runs the lifespan startup (schema check, background
+# threads), serves one GET /api/health straight through the ASGI app (no
+# server, no httpx), prints the elapsed milliseconds, then shuts down.
+FIRST_REQUEST_SNIPPET = r"""
+import time
+t0 = time.perf_counter()
+import asyncio
+import main
+
+async def first_request():
+    to_app, from_app = asyncio.Queue(), asyncio.Queue()
+    lifespan = asyncio.create_task(
+        main.app({"type": "lifespan", "asgi": {"version": "3.0"}, "state": {}}, to_app.get, from_app.put)
+    )
+    await to_app.put({"type": "lifespan.startup"})
+    message = await from_app.get()
+    assert message["type"] == "lifespan.startup.complete", message.get("message", message)
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": "/api/health",
+        "raw_path": b"/api/health", "root_path": "", "query_string": b"",
+        "headers": [], "client": ("bench", 1), "server": ("bench", 80),
+    }
+    status = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+
+    await main.app(scope, receive, send)
+    assert status == [200], status
+    elapsed_ms = (time.perf_counter() - t0) * 1000
+
+    await to_app.put({"type": "lifespan.shutdown"})
+    await from_app.get()
+    await lifespan
+    return elapsed_ms
+
+print(asyncio.run(first_request()))
+"""
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def run_python(args, **kwargs):
+    return subprocess.run(
+        [sys.executable, *args],
+        cwd=HERE,
+        capture_output=True,
+        text=True,
+        check=True,
+        **kwargs,
+    )
+
+
+def import_profile():
+    """
+    Runs `python -X importtime -c "import main"` and returns
+    (total_ms, [(cumulative_ms, module)] for top-level imports of main).
+    """
+    proc = run_python(["-X", "importtime", "-c", "import main"])
+    total_ms = 0.0
+    children = []
+    for line in proc.stderr.splitlines():
+        m = IMPORTTIME_LINE.match(line)
+        if not m:
+            continue
+        cumulative_ms = int(m.group(2)) / 1000
+        depth = len(m.group(3)) - 1
+        if depth == 0:
+            if m.group(4) == "main":
+                total_ms = cumulative_ms
+                break
+            # importtime prints children before their parent, so start
+            # over at every other top-level module
+            children = []
+        elif depth == 2:
+            children.append((cumulative_ms, m.group(4)))
+    return total_ms, sorted(children, reverse=True)
+
+
+def time_to_first_request_ms(migrate: bool = True) -> float:
+    """
+    Startup + first request against a fresh SQLite database, migrated
+    beforehand (outside the timing) unless migrate=False.
+    """
+    with tempfile.TemporaryDirectory(prefix="vibechain-startup-") as tmp:
+        env = dict(os.environ)
+        env["DATABASE_URL"] = f"sqlite:///{tmp}/startup.db"
+        env["AUTO_MIGRATE"] = "false"
+        env.pop("SHARD_DATABASE_URLS", None)
+        if migrate:
+            run_python(["migrate.py"], env=env)
+        return float(run_python(["-c", FIRST_REQUEST_SNIPPET], env=env).stdout.strip())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure backend startup time.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--import-budget-ms", type=float, default=IMPORT_BUDGET_MS)
+    parser.add_argument(
+        "--first-request-budget-ms", type=float, default=FIRST_REQUEST_BUDGET_MS
+    )
+    args = parser.parse_args()
+
+    import_runs = []
+    for _ in range(args.runs):
+        total_ms, children = import_profile()
+        import_runs.append(total_ms)
+    import_ms = statistics.median(import_runs)
+
+    print(f"import main (median of {args.runs}): {import_ms:.1f} ms")
+    print("  slowest direct imports (last run):")
+    for cumulative_ms, module in children[:8]:
+        print(f"    {cumulative_ms:8.1f} ms  {module}")
+
+    first_ms = statistics.median(time_to_first_request_ms() for _ in range(args.runs))
+    print(f"time to first request (median of {args.runs}): {first_ms:.1f} ms")
+
+    failed = False
+    if import_ms > args.import_budget_ms:
+        print(f"FAIL: import budget {args.import_budget_ms:.0f} ms exceeded")
+        failed = True
+    if first_ms > args.first_request_budget_ms:
+        print(f"FAIL: first request budget {args.first_request_budget_ms:.0f} ms exceeded")
+        failed = True
+    if failed:
+        sys.exit(1)
+    print("OK: within startup budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+import argparse
+
+from main import SessionLocal, reputation
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Snapshot reputation scores and prune old folded events (run from cron)."
+    )
+    parser.add_argument("--retain-days", type=int, default=30,
+                        help="keep events newer than this for auditing")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        stats = reputation.compact(db, retain_days=args.retain_days)
+    finally:
+        db.close()
+
+    print("Reputation compaction complete.")
+    print(f"  addresses folded:   {stats['folded']}")
+    print(f"  legacy rows anchored: {stats['anchored']}")
+    print(f"  events pruned:      {stats['pruned']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,42 @@
+import itertools
+import json
 import os
 import secrets
+import time
+from datetime import datetime
+from types import SimpleNamespace
 from typing import Optional, List
 
 from dotenv import load_dotenv
 
 from fastapi import FastAPI, HTTPException, Depends, Query, Header
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from sqlalchemy import (
     Column,
     Integer,
     String,
     Float,
+    DateTime,
+    Index,
+    UniqueConstraint,
     create_engine,
     desc,
+    func,
+    inspect,
+    or_,
+    text,
 )
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import declarative_base, sessionmaker, Session
 
-import requests
+from agent_limits import AgentLimiter, AgentLimitState
+from archive import ColdArchive, merge_with_archived
+from batch_writer import BatchWriter
+from price_feed import PriceFeed, source_from_env
+from reputation import ReputationLedger
+from search import ensure_invoice_search, prefix_filter, search_invoice_ids, supports_fts
+from sharding import ShardRouter, ShardSessions
 
 # ============ ENV + DB SETUP ============
 
@@ -25,35 +44,105 @@ load_dotenv()  # load .env from current directory
 
 BLOCKFROST_PROJECT_ID_PREVIEW = os.getenv("BLOCKFROST_PROJECT_ID_PREVIEW")
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./vibechain.db")
+# Schema changes normally run via `python migrate.py`; set for local dev
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "false").lower() == "true"
 
 if not BLOCKFROST_PROJECT_ID_PREVIEW:
     raise RuntimeError("BLOCKFROST_PROJECT_ID_PREVIEW is not set in .env")
 
-# Support both SQLite (local dev) and Oracle (XE / Docker)
-if DATABASE_URL.startswith("sqlite"):
-    # Local SQLite file (default)
-    engine = create_engine(
-        DATABASE_URL,
-        connect_args={"check_same_thread": False},
-    )
-else:
+
+def make_engine(url: str):
+    # Support both SQLite (local dev) and Oracle (XE / Docker)
+    if url.startswith("sqlite"):
+        # Local SQLite file (default)
+        return create_engine(
+            url,
+            connect_args={"check_same_thread": False},
+        )
     # Oracle XE or any other RDBMS – no SQLite-specific args
-    engine = create_engine(DATABASE_URL)
+    return create_engine(url)
+
+
+engine = make_engine(DATABASE_URL)
+
+# Optional merchant sharding: receipts, invoices and agent payments go to
+# one of these databases (with the key directory, see ShardDirectory);
+# DATABASE_URL keeps everything else.
+SHARD_DATABASE_URLS = [
+    u.strip() for u in os.getenv("SHARD_DATABASE_URLS", "").split(",") if u.strip()
+]
+# A key claimed longer ago than this with no row behind it was left by a
+# crash between the directory and shard commits and may be claimed again
+SHARD_CLAIM_GRACE_SECONDS = float(os.getenv("SHARD_CLAIM_GRACE_SECONDS", "60"))
+shard_router = (
+    ShardRouter([make_engine(u) for u in SHARD_DATABASE_URLS])
+    if SHARD_DATABASE_URLS
+    else None
+)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Cold storage for receipts / agent payments moved out by archive_receipts.py
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "./archive")
+cold_archive = ColdArchive(ARCHIVE_DIR)
+
+# Reputation decays exponentially; 0 disables decay
+REPUTATION_HALF_LIFE_DAYS = float(os.getenv("REPUTATION_HALF_LIFE_DAYS", "180"))
+# Fixed reference time for rank_key (see UserReputation)
+REPUTATION_EPOCH = datetime(2025, 1, 1)
+# Events are folded into snapshots once written at least this long ago
+REPUTATION_FOLD_LAG_SECONDS = float(os.getenv("REPUTATION_FOLD_LAG_SECONDS", "60"))
+
+# ADA/USD series used to value receipts: a CSV path or an http(s) JSON url
+ADA_PRICE_SOURCE = os.getenv("ADA_PRICE_SOURCE")
+price_feed = PriceFeed(
+    source_from_env(ADA_PRICE_SOURCE),
+    refresh_seconds=float(os.getenv("ADA_PRICE_REFRESH_SECONDS", "300")),
+    # a price further than this from a receipt's time is not used
+    max_age_seconds=float(os.getenv("ADA_PRICE_MAX_AGE_SECONDS", "86400")),
+)
 
 
 # ============ DB MODELS ============
 
 
 class UserReputation(Base):
+    """
+    Cached fold of an address's ReputationEvent rows (see ReputationLedger):
+      - score: decayed score as of anchor_at
+      - folded_at, last_event_id: events up to this (written_at, id)
+        are already folded in
+      - rank_key: score normalised to REPUTATION_EPOCH, so one ORDER BY
+        ranks every address by its current decayed score
+    """
     __tablename__ = "user_reputation"
 
     id = Column(Integer, primary_key=True, index=True)
     address = Column(String, unique=True, index=True, nullable=False)
     score = Column(Float, default=0.0)
+    anchor_at = Column(DateTime, nullable=True)
+    last_event_id = Column(Integer, default=0, nullable=True)
+    folded_at = Column(DateTime, nullable=True)
+    rank_key = Column(Float, index=True, nullable=True)
+
+
+class ReputationEvent(Base):
+    """
+    Append-only reputation log; written in batches by reputation_events.
+    """
+    __tablename__ = "reputation_events"
+    # folding reads "events for address after (written_at, id)"
+    __table_args__ = (
+        Index("ix_reputation_events_address_written", "address", "written_at", "id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    address = Column(String, nullable=False)
+    delta = Column(Float, nullable=False)
+    source = Column(String, nullable=False)  # receipt, invoice_merchant, ...
+    created_at = Column(DateTime, default=datetime.utcnow, index=True, nullable=False)
+    written_at = Column(DateTime, nullable=True)  # set by the batch write
 
 
 class PaymentReceipt(Base):
@@ -65,6 +154,8 @@ class PaymentReceipt(Base):
     merchant_address = Column(String, index=True, nullable=False)
     amount_lovelace = Column(Integer, nullable=False)
     nft_asset_id = Column(String, nullable=True)  # policy_id.asset_name
+    created_at = Column(DateTime, default=datetime.utcnow, index=True, nullable=True)
+    fiat_value_usd = Column(Float, nullable=True)  # ADA/USD at created_at
 
 
 class InvoiceNFT(Base):
@@ -92,6 +183,26 @@ class Agent(Base):
     api_key = Column(String, unique=True, index=True, nullable=False)
     owner_address = Column(String, nullable=True)          # e.g. wallet address
     reputation_address = Column(String, nullable=True)     # address used for scoring
+    # limits on the agent payment rail (NULL = unlimited)
+    rate_limit_per_minute = Column(Integer, nullable=True)
+    rate_limit_burst = Column(Integer, nullable=True)      # defaults to per-minute rate
+    spend_cap_lovelace = Column(Integer, nullable=True)
+    spend_window_seconds = Column(Integer, nullable=True)  # rolling window, default 1 day
+
+
+class AgentLimitSnapshot(Base):
+    """
+    Periodically persisted AgentLimiter state, so a restart does not
+    hand every agent a fresh bucket and spend window.
+    """
+    __tablename__ = "agent_limit_state"
+
+    agent_id = Column(Integer, primary_key=True)
+    tokens = Column(Float, nullable=True)
+    bucket_at = Column(Float, nullable=False, default=0.0)
+    spend_window = Column(Integer, nullable=False, default=0)
+    spend_slots = Column(String, nullable=False, default="[]")  # [[slot, lovelace], ...]
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
 
 
 class AgentPayment(Base):
@@ -103,9 +214,144 @@ class AgentPayment(Base):
     amount_lovelace = Column(Integer, nullable=False)
     tx_hash = Column(String, nullable=True)                # off-chain or on-chain hash
     receipt_nft_asset_id = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True, nullable=True)
 
 
-Base.metadata.create_all(bind=engine)
+class ShardDirectory(Base):
+    """
+    Key directory used when sharding is enabled:
+    (kind, key) -> shard, e.g. ("tx", tx_hash) or ("invoice", invoice_id).
+    The directory is itself partitioned: an entry lives in the shard that
+    owns its key, so claiming a key never touches the main database.
+    The entry id (time-ordered, see ShardRouter.next_id) doubles as the
+    global id of the sharded row.
+    """
+    __tablename__ = "shard_directory"
+    __table_args__ = (UniqueConstraint("kind", "key", name="uq_shard_directory_kind_key"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, nullable=False)
+    key = Column(String, nullable=False)
+    shard = Column(Integer, nullable=False)
+
+
+reputation_events = BatchWriter(
+    engine,
+    ReputationEvent.__table__,
+    max_batch=int(os.getenv("REPUTATION_BATCH_SIZE", "200")),
+    flush_seconds=float(os.getenv("REPUTATION_FLUSH_SECONDS", "1.0")),
+    stamp_column="written_at",
+)
+
+reputation = ReputationLedger(
+    reputation_events,
+    ReputationEvent,
+    UserReputation,
+    half_life_days=REPUTATION_HALF_LIFE_DAYS,
+    epoch=REPUTATION_EPOCH,
+    fold_lag_seconds=REPUTATION_FOLD_LAG_SECONDS,
+)
+
+
+def load_agent_limit_state(agent_id: int) -> Optional[AgentLimitState]:
+    db = SessionLocal()
+    try:
+        row = db.get(AgentLimitSnapshot, agent_id)
+        if row is None:
+            return None
+        return AgentLimitState(
+            tokens=row.tokens,
+            bucket_at=row.bucket_at,
+            spend_window=row.spend_window,
+            slots={slot: amount for slot, amount in json.loads(row.spend_slots)},
+        )
+    finally:
+        db.close()
+
+
+def save_agent_limit_states(states) -> None:
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        for agent_id, state in states.items():
+            db.merge(
+                AgentLimitSnapshot(
+                    agent_id=agent_id,
+                    tokens=state.tokens,
+                    bucket_at=state.bucket_at,
+                    spend_window=state.spend_window,
+                    spend_slots=json.dumps(sorted(state.slots.items())),
+                    updated_at=now,
+                )
+            )
+        db.commit()
+    finally:
+        db.close()
+
+
+agent_limiter = AgentLimiter(
+    load_agent_limit_state,
+    save_agent_limit_states,
+    max_agents=int(os.getenv("AGENT_LIMITER_MAX_AGENTS", "10000")),
+    persist_seconds=float(os.getenv("AGENT_LIMITER_PERSIST_SECONDS", "10")),
+)
+
+
+SHARDED_TABLES = [
+    PaymentReceipt.__table__,
+    InvoiceNFT.__table__,
+    AgentPayment.__table__,
+    ShardDirectory.__table__,
+]
+
+
+def migrate_schema(bind=engine, tables=None) -> None:
+    """
+    create_all() never alters existing tables, so older database files
+    get any missing (nullable) model columns and indexes added here.
+    """
+    tables = tables or Base.metadata.sorted_tables
+    Base.metadata.create_all(bind=bind, tables=tables)
+    insp = inspect(bind)
+    with bind.begin() as conn:
+        for table in tables:
+            existing = {c["name"] for c in insp.get_columns(table.name)}
+            missing = [c for c in table.columns if c.name not in existing]
+            for col in missing:
+                col_type = col.type.compile(dialect=bind.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD {col.name} {col_type}"))
+            if missing:
+                for index in table.indexes:
+                    index.create(conn, checkfirst=True)
+
+
+def missing_schema(bind=engine, tables=None) -> List[str]:
+    """Model tables / columns the database does not have yet."""
+    tables = tables or Base.metadata.sorted_tables
+    insp = inspect(bind)
+    existing_tables = set(insp.get_table_names())
+    missing = []
+    for table in tables:
+        if table.name not in existing_tables:
+            missing.append(table.name)
+            continue
+        existing = {c["name"] for c in insp.get_columns(table.name)}
+        missing += [f"{table.name}.{c.name}" for c in table.columns if c.name not in existing]
+    return missing
+
+
+def migrate_all() -> None:
+    """
+    Explicit migration step (not run at import): main database plus
+    every shard database when sharding is enabled.
+    """
+    migrate_schema()
+    reputation.migrate(engine)
+    ensure_invoice_search(engine)
+    if shard_router is not None:
+        for shard_engine in shard_router.engines:
+            migrate_schema(shard_engine, SHARDED_TABLES)
+            ensure_invoice_search(shard_engine)
 
 
 # ============ Pydantic SCHEMAS ============
@@ -135,6 +381,7 @@ class ReceiptOut(BaseModel):
     merchant_address: str
     amount_lovelace: int
     nft_asset_id: Optional[str]
+    fiat_value_usd: Optional[float] = None
 
     class Config:
         from_attributes = True  # pydantic v2
@@ -161,6 +408,16 @@ class InvoiceOut(BaseModel):
         from_attributes = True
 
 
+class InvoiceSearchPage(BaseModel):
+    items: List[InvoiceOut]
+    next_before_id: Optional[int] = None  # pass as before_id for the next page
+
+
+class ReceiptSearchPage(BaseModel):
+    items: List[ReceiptOut]
+    next_after_tx_hash: Optional[str] = None  # pass as after_tx_hash for the next page
+
+
 class LeaderboardEntry(BaseModel):
     address: str
     score: float
@@ -170,6 +427,11 @@ class AgentCreate(BaseModel):
     name: str
     owner_address: Optional[str] = None
     reputation_address: Optional[str] = None
+    # limits on the pay rail; omit for unlimited
+    rate_limit_per_minute: Optional[int] = Field(None, ge=1)
+    rate_limit_burst: Optional[int] = Field(None, ge=1)
+    spend_cap_lovelace: Optional[int] = Field(None, ge=1)
+    spend_window_seconds: Optional[int] = Field(None, ge=1)
 
 
 class AgentOut(BaseModel):
@@ -178,6 +440,10 @@ class AgentOut(BaseModel):
     api_key: str
     owner_address: Optional[str]
     reputation_address: Optional[str]
+    rate_limit_per_minute: Optional[int] = None
+    rate_limit_burst: Optional[int] = None
+    spend_cap_lovelace: Optional[int] = None
+    spend_window_seconds: Optional[int] = None
 
     class Config:
         from_attributes = True
@@ -185,7 +451,7 @@ class AgentOut(BaseModel):
 
 class AgentPayRequest(BaseModel):
     merchant_address: str
-    amount_lovelace: int
+    amount_lovelace: int = Field(..., gt=0)
     tx_hash: Optional[str] = None  # optional external hash
 
 
@@ -220,10 +486,149 @@ def get_db() -> Session:
         db.close()
 
 
+def get_shards(db: Session = Depends(get_db)) -> ShardSessions:
+    shards = ShardSessions(shard_router, db)
+    try:
+        yield shards
+    finally:
+        shards.close()
+
+
+# (model, key column, archived table) behind each ShardDirectory kind
+SHARD_KEYS = {
+    "tx": (PaymentReceipt, "tx_hash", "payment_receipts"),
+    "invoice": (InvoiceNFT, "invoice_id", None),
+    "agent_payment": (AgentPayment, "tx_hash", "agent_payments"),
+}
+
+
+def store_row(shards: ShardSessions, kind: str, key: str, merchant_address: str, row) -> None:
+    """
+    Inserts a new merchant-scoped row. When sharded, (kind, key) is first
+    claimed in the directory of the shard owning the key, under a new
+    time-ordered global id (ShardRouter.next_id) that the row takes too;
+    when that is the merchant's shard too, claim and row commit together.
+    Otherwise a failed shard write releases the claim again, and a claim
+    left without a row by a crash in between is taken over (see
+    _orphaned_claim).
+    """
+    if not shards.sharded:
+        shards.db.add(row)
+        shards.db.commit()
+        shards.db.refresh(row)
+        return
+
+    shard = shard_router.shard_for(merchant_address)
+    dir_shard = shard_router.shard_for(key)
+    dir_db = shards.for_shard(dir_shard)
+    shard_db = shards.for_shard(shard)
+
+    collided = False
+    for _ in range(8):
+        entry = ShardDirectory(
+            id=shard_router.next_id(dir_shard, collided), kind=kind, key=key, shard=shard
+        )
+        row.id = entry.id
+        dir_db.add(entry)
+        if shard_db is dir_db:
+            shard_db.add(row)
+        try:
+            dir_db.commit()
+            break
+        except IntegrityError:
+            dir_db.rollback()
+
+        claim = (
+            dir_db.query(ShardDirectory)
+            .filter(ShardDirectory.kind == kind, ShardDirectory.key == key)
+            .first()
+        )
+        collided = claim is None
+        if collided:
+            # another process took the same id (same millisecond): new id
+            continue
+        if not _orphaned_claim(shards, kind, key, claim):
+            raise HTTPException(status_code=400, detail=f"{kind} {key} already exists")
+        dir_db.query(ShardDirectory).filter(ShardDirectory.id == claim.id).delete(
+            synchronize_session=False
+        )
+        dir_db.commit()
+    else:
+        raise HTTPException(status_code=503, detail=f"Could not claim {kind} {key}, try again")
+
+    if shard_db is not dir_db:
+        shard_db.add(row)
+        try:
+            shard_db.commit()
+        except Exception:
+            shard_db.rollback()
+            dir_db.delete(entry)
+            dir_db.commit()
+            raise
+    shard_db.refresh(row)
+
+
+def _orphaned_claim(shards: ShardSessions, kind: str, key: str, claim: ShardDirectory) -> bool:
+    """
+    True when a directory claim has no row behind it, hot or archived.
+    Claims younger than SHARD_CLAIM_GRACE_SECONDS may belong to a write
+    still between its two commits, so they are never orphans.
+    """
+    if time.time() - shard_router.id_time(claim.id) < SHARD_CLAIM_GRACE_SECONDS:
+        return False
+    model, column, archived_table = SHARD_KEYS[kind]
+    hot = (
+        shards.for_shard(claim.shard)
+        .query(model.id)
+        .filter(getattr(model, column) == key)
+        .first()
+    )
+    if hot is not None:
+        return False
+    if archived_table is None:
+        return True
+    return next(cold_archive.scan(archived_table, **{column: key}), None) is None
+
+
+def find_by_key(shards: ShardSessions, model, kind: str, column, key: str):
+    """
+    Looks up a sharded row by its global key (tx_hash / invoice_id).
+    Returns (session, row); row is None when not found.
+    """
+    if shards.sharded:
+        dir_db = shards.for_shard(shard_router.shard_for(key))
+        entry = (
+            dir_db.query(ShardDirectory)
+            .filter(ShardDirectory.kind == kind, ShardDirectory.key == key)
+            .first()
+        )
+        if entry is None:
+            return dir_db, None
+        session = shards.for_shard(entry.shard)
+    else:
+        session = shards.db
+    return session, session.query(model).filter(column == key).first()
+
+
+def find_receipt(shards: ShardSessions, tx_hash: str):
+    """
+    The receipt recorded for tx_hash: the hot row, else the archived one
+    (via the archive's tx index), else None.
+    """
+    _, existing = find_by_key(shards, PaymentReceipt, "tx", PaymentReceipt.tx_hash, tx_hash)
+    if existing is None:
+        archived = cold_archive.lookup_tx_hash(tx_hash)
+        if archived is not None:
+            existing = SimpleNamespace(**archived)
+    return existing
+
+
 def verify_tx_exists_on_blockfrost(tx_hash: str) -> bool:
     """
     Minimal check: confirm tx exists on preview via Blockfrost.
     """
+    import requests  # imported lazily, only the mint path needs it
+
     url = f"https://cardano-preview.blockfrost.io/api/v0/txs/{tx_hash}"
     headers = {"project_id": BLOCKFROST_PROJECT_ID_PREVIEW}
     try:
@@ -233,19 +638,10 @@ def verify_tx_exists_on_blockfrost(tx_hash: str) -> bool:
     return r.status_code == 200
 
 
-def update_reputation(db: Session, address: str, delta: float = 1.0) -> float:
-    rep = db.query(UserReputation).filter(UserReputation.address == address).first()
-    if rep is None:
-        rep = UserReputation(address=address, score=0.0)
-        db.add(rep)
-        db.commit()
-        db.refresh(rep)
-
-    rep.score += delta
-    db.add(rep)
-    db.commit()
-    db.refresh(rep)
-    return rep.score
+def update_reputation(
+    db: Session, address: str, delta: float = 1.0, source: str = "receipt"
+) -> float:
+    return reputation.record(db, address, delta, source)
 
 
 def fake_mint_nft_receipt(tx_hash: str) -> str:
@@ -270,9 +666,22 @@ def apply_invoice_reputation(db: Session, inv: InvoiceNFT) -> None:
       - Merchant +2
       - Customer +1 (if present)
     """
-    update_reputation(db, inv.merchant_address, delta=2.0)
+    update_reputation(db, inv.merchant_address, delta=2.0, source="invoice_merchant")
     if inv.customer_address:
-        update_reputation(db, inv.customer_address, delta=1.0)
+        update_reputation(db, inv.customer_address, delta=1.0, source="invoice_customer")
+
+
+def new_receipt(**fields) -> PaymentReceipt:
+    """
+    Builds a PaymentReceipt stamped with created_at and its USD value
+    from the in-memory price series (no external call).
+    """
+    created_at = datetime.utcnow()
+    return PaymentReceipt(
+        created_at=created_at,
+        fiat_value_usd=price_feed.value_usd(fields["amount_lovelace"], created_at),
+        **fields,
+    )
 
 
 def generate_api_key() -> str:
@@ -294,6 +703,35 @@ app.add_middleware(
 )
 
 
+@app.on_event("startup")
+def startup():
+    if AUTO_MIGRATE:
+        migrate_all()
+    else:
+        # fail fast instead of on the first write
+        missing = missing_schema()
+        if shard_router is not None:
+            for shard_engine in shard_router.engines:
+                missing += missing_schema(shard_engine, SHARDED_TABLES)
+        if missing:
+            raise RuntimeError(
+                "Database schema is out of date (missing: "
+                + ", ".join(missing[:5])
+                + (", ..." if len(missing) > 5 else "")
+                + "). Run `python migrate.py` or set AUTO_MIGRATE=true."
+            )
+    price_feed.start()
+    reputation_events.start()
+    agent_limiter.start()
+
+
+@app.on_event("shutdown")
+def shutdown():
+    price_feed.stop()
+    reputation_events.stop()
+    agent_limiter.stop()
+
+
 # ============ BASIC HEALTH ============
 
 
@@ -306,7 +744,11 @@ def health():
 
 
 @app.post("/api/mint-receipt", response_model=MintReceiptResponse)
-def mint_receipt(payload: MintReceiptRequest, db: Session = Depends(get_db)):
+def mint_receipt(
+    payload: MintReceiptRequest,
+    db: Session = Depends(get_db),
+    shards: ShardSessions = Depends(get_shards),
+):
     """
     Called after a payment:
     - Verifies tx on preview via Blockfrost
@@ -314,22 +756,13 @@ def mint_receipt(payload: MintReceiptRequest, db: Session = Depends(get_db)):
     - Fake mints an NFT receipt
     - Updates user reputation
     """
-    # 1) Avoid duplicates
-    existing = (
-        db.query(PaymentReceipt)
-        .filter(PaymentReceipt.tx_hash == payload.tx_hash)
-        .first()
-    )
+    # 1) Avoid duplicates (hot table first, then the archive's tx index)
+    existing = find_receipt(shards, payload.tx_hash)
     if existing:
-        rep = (
-            db.query(UserReputation)
-            .filter(UserReputation.address == payload.payer_address)
-            .first()
-        )
         return MintReceiptResponse(
-            tx_hash=existing.tx_hash,
+            tx_hash=payload.tx_hash,
             nft_asset_id=existing.nft_asset_id,
-            reputation_score=rep.score if rep else 0.0,
+            reputation_score=reputation.current(db, payload.payer_address),
         )
 
     # 2) On-chain existence check
@@ -342,17 +775,15 @@ def mint_receipt(payload: MintReceiptRequest, db: Session = Depends(get_db)):
     # 3) Mint receipt NFT (stub)
     nft_asset_id = fake_mint_nft_receipt(payload.tx_hash)
 
-    # 4) Save receipt
-    receipt = PaymentReceipt(
+    # 4) Save receipt (in the merchant's shard when sharded)
+    receipt = new_receipt(
         tx_hash=payload.tx_hash,
         payer_address=payload.payer_address,
         merchant_address=payload.merchant_address,
         amount_lovelace=payload.amount_lovelace,
         nft_asset_id=nft_asset_id,
     )
-    db.add(receipt)
-    db.commit()
-    db.refresh(receipt)
+    store_row(shards, "tx", payload.tx_hash, payload.merchant_address, receipt)
 
     # 5) Update reputation
     new_score = update_reputation(db, payload.payer_address, delta=1.0)
@@ -364,68 +795,74 @@ def mint_receipt(payload: MintReceiptRequest, db: Session = Depends(get_db)):
     )
 
 
-@app.get("/api/reputation/{address}", response_model=ReputationResponse)
-def get_reputation(address: str, db: Session = Depends(get_db)):
-    rep = db.query(UserReputation).filter(UserReputation.address == address).first()
-    if not rep:
-        return ReputationResponse(address=address, score=0.0)
-    return ReputationResponse(address=rep.address, score=rep.score)
-
-
 @app.get("/api/reputation/leaderboard", response_model=List[LeaderboardEntry])
 def get_leaderboard(
     limit: int = Query(10, ge=1, le=100),
     db: Session = Depends(get_db),
 ):
     """
-    Top addresses by score.
+    Top addresses by current decayed score (from the cached snapshots;
+    compact_reputation.py folds outstanding events into them).
     """
     rows = (
         db.query(UserReputation)
-        .order_by(desc(UserReputation.score))
+        .order_by(desc(UserReputation.rank_key).nulls_last())
         .limit(limit)
         .all()
     )
-    return [LeaderboardEntry(address=r.address, score=r.score) for r in rows]
+    now = datetime.utcnow()
+    return [
+        LeaderboardEntry(address=r.address, score=reputation.decayed(r.score, r.anchor_at, now))
+        for r in rows
+    ]
+
+
+# registered after /leaderboard, which it would otherwise swallow
+@app.get("/api/reputation/{address}", response_model=ReputationResponse)
+def get_reputation(address: str, db: Session = Depends(get_db)):
+    return ReputationResponse(address=address, score=reputation.current(db, address))
 
 
 @app.get("/api/receipts/by-user/{address}", response_model=List[ReceiptOut])
-def list_receipts_by_user(address: str, db: Session = Depends(get_db)):
-    receipts = (
-        db.query(PaymentReceipt)
+def list_receipts_by_user(address: str, shards: ShardSessions = Depends(get_shards)):
+    # payers are not a shard key, so ask every shard in parallel
+    per_shard = shards.gather(
+        lambda s: s.query(PaymentReceipt)
         .filter(PaymentReceipt.payer_address == address)
         .order_by(desc(PaymentReceipt.id))
         .all()
     )
-    return receipts
+    receipts = itertools.chain.from_iterable(per_shard)
+    archived = cold_archive.scan("payment_receipts", payer_address=address)
+    return merge_with_archived(receipts, archived, key="tx_hash")
 
 
 @app.get("/api/receipts/by-merchant/{address}", response_model=List[ReceiptOut])
-def list_receipts_by_merchant(address: str, db: Session = Depends(get_db)):
+def list_receipts_by_merchant(address: str, shards: ShardSessions = Depends(get_shards)):
     receipts = (
-        db.query(PaymentReceipt)
+        shards.for_merchant(address)
+        .query(PaymentReceipt)
         .filter(PaymentReceipt.merchant_address == address)
         .order_by(desc(PaymentReceipt.id))
         .all()
     )
-    return receipts
+    archived = cold_archive.scan("payment_receipts", merchant_address=address)
+    return merge_with_archived(receipts, archived, key="tx_hash")
 
 
 # ============ INVOICES (LAYER 2) ============
 
 
 @app.post("/api/invoices", response_model=InvoiceOut)
-def create_invoice(payload: InvoiceCreate, db: Session = Depends(get_db)):
+def create_invoice(payload: InvoiceCreate, shards: ShardSessions = Depends(get_shards)):
     """
     Create an invoice record.
     For now:
       - store it in DB
       - generate a fake NFT id (to simulate invoice NFT)
     """
-    existing = (
-        db.query(InvoiceNFT)
-        .filter(InvoiceNFT.invoice_id == payload.invoice_id)
-        .first()
+    _, existing = find_by_key(
+        shards, InvoiceNFT, "invoice", InvoiceNFT.invoice_id, payload.invoice_id
     )
     if existing:
         raise HTTPException(status_code=400, detail="invoice_id already exists")
@@ -441,17 +878,18 @@ def create_invoice(payload: InvoiceCreate, db: Session = Depends(get_db)):
         status="pending",
         nft_asset_id=nft_asset_id,
     )
-    db.add(inv)
-    db.commit()
-    db.refresh(inv)
+    store_row(shards, "invoice", payload.invoice_id, payload.merchant_address, inv)
 
     return inv
 
 
 @app.get("/api/invoices/{merchant_address}", response_model=List[InvoiceOut])
-def list_invoices_for_merchant(merchant_address: str, db: Session = Depends(get_db)):
+def list_invoices_for_merchant(
+    merchant_address: str, shards: ShardSessions = Depends(get_shards)
+):
     invoices = (
-        db.query(InvoiceNFT)
+        shards.for_merchant(merchant_address)
+        .query(InvoiceNFT)
         .filter(InvoiceNFT.merchant_address == merchant_address)
         .order_by(desc(InvoiceNFT.id))
         .all()
@@ -460,14 +898,16 @@ def list_invoices_for_merchant(merchant_address: str, db: Session = Depends(get_
 
 
 @app.post("/api/invoices/{invoice_id}/mark-paid", response_model=InvoiceOut)
-def mark_invoice_paid(invoice_id: str, db: Session = Depends(get_db)):
+def mark_invoice_paid(
+    invoice_id: str,
+    db: Session = Depends(get_db),
+    shards: ShardSessions = Depends(get_shards),
+):
     """
     Mark invoice as paid + apply reputation effects once.
     """
-    inv = (
-        db.query(InvoiceNFT)
-        .filter(InvoiceNFT.invoice_id == invoice_id)
-        .first()
+    shard_db, inv = find_by_key(
+        shards, InvoiceNFT, "invoice", InvoiceNFT.invoice_id, invoice_id
     )
     if not inv:
         raise HTTPException(status_code=404, detail="Invoice not found")
@@ -477,9 +917,9 @@ def mark_invoice_paid(invoice_id: str, db: Session = Depends(get_db)):
         return inv
 
     inv.status = "paid"
-    db.add(inv)
-    db.commit()
-    db.refresh(inv)
+    shard_db.add(inv)
+    shard_db.commit()
+    shard_db.refresh(inv)
 
     # Apply reputation boosts
     apply_invoice_reputation(db, inv)
@@ -487,6 +927,89 @@ def mark_invoice_paid(invoice_id: str, db: Session = Depends(get_db)):
     return inv
 
 
+# ============ SEARCH ============
+
+
+@app.get("/api/search/invoices", response_model=InvoiceSearchPage)
+def search_invoices(
+    merchant_address: str,
+    q: str = Query(..., min_length=1),
+    status: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    before_id: Optional[int] = None,
+    shards: ShardSessions = Depends(get_shards),
+):
+    """
+    Search a merchant's invoices by description words or invoice_id
+    prefix (every term must match as a prefix), newest first.
+    """
+    db = shards.for_merchant(merchant_address)
+
+    if supports_fts(db.get_bind()):
+        ids = search_invoice_ids(db, q, merchant_address, status, before_id, limit)
+        invoices = []
+        if ids:
+            invoices = (
+                db.query(InvoiceNFT)
+                .filter(InvoiceNFT.id.in_(ids), InvoiceNFT.merchant_address == merchant_address)
+                .order_by(desc(InvoiceNFT.id))
+                .all()
+            )
+        next_before_id = invoices[-1].id if len(invoices) == limit else None
+        return InvoiceSearchPage(items=invoices, next_before_id=next_before_id)
+
+    # No FTS on this backend: plain LIKE scan of the merchant's invoices
+    query = db.query(InvoiceNFT).filter(InvoiceNFT.merchant_address == merchant_address)
+    for term in q.split():
+        query = query.filter(
+            or_(
+                func.lower(InvoiceNFT.description).contains(term.lower()),
+                prefix_filter(InvoiceNFT.invoice_id, term),
+            )
+        )
+    if status:
+        query = query.filter(InvoiceNFT.status == status)
+    if before_id is not None:
+        query = query.filter(InvoiceNFT.id < before_id)
+    invoices = query.order_by(desc(InvoiceNFT.id)).limit(limit).all()
+    next_before_id = invoices[-1].id if len(invoices) == limit else None
+    return InvoiceSearchPage(items=invoices, next_before_id=next_before_id)
+
+
+@app.get("/api/search/receipts", response_model=ReceiptSearchPage)
+def search_receipts(
+    tx_hash_prefix: str = Query(..., min_length=4),
+    merchant_address: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    after_tx_hash: Optional[str] = None,
+    shards: ShardSessions = Depends(get_shards),
+):
+    """
+    Receipts whose tx_hash starts with tx_hash_prefix, in tx_hash order.
+    Uses the unique tx_hash index as a range scan.
+    """
+
+    def lookup(s: Session):
+        query = s.query(PaymentReceipt).filter(
+            prefix_filter(PaymentReceipt.tx_hash, tx_hash_prefix)
+        )
+        if merchant_address:
+            query = query.filter(PaymentReceipt.merchant_address == merchant_address)
+        if after_tx_hash is not None:
+            query = query.filter(PaymentReceipt.tx_hash > after_tx_hash)
+        return query.order_by(PaymentReceipt.tx_hash).limit(limit).all()
+
+    if merchant_address:
+        receipts = lookup(shards.for_merchant(merchant_address))
+    else:
+        per_shard = shards.gather(lookup)
+        receipts = sorted(itertools.chain.from_iterable(per_shard), key=lambda r: r.tx_hash)
+        receipts = receipts[:limit]
+
+    next_after = receipts[-1].tx_hash if len(receipts) == limit else None
+    return ReceiptSearchPage(items=receipts, next_after_tx_hash=next_after)
+
+
 # ============ AGENT RAILS (DAGCHAIN-STYLE) ============
 
 
@@ -502,6 +1025,10 @@ def create_agent(payload: AgentCreate, db: Session = Depends(get_db)):
         api_key=api_key,
         owner_address=payload.owner_address,
         reputation_address=payload.reputation_address,
+        rate_limit_per_minute=payload.rate_limit_per_minute,
+        rate_limit_burst=payload.rate_limit_burst,
+        spend_cap_lovelace=payload.spend_cap_lovelace,
+        spend_window_seconds=payload.spend_window_seconds,
     )
     db.add(agent)
     db.commit()
@@ -514,6 +1041,7 @@ def agent_pay(
     agent_id: int,
     payload: AgentPayRequest,
     db: Session = Depends(get_db),
+    shards: ShardSessions = Depends(get_shards),
     x_api_key: str = Header(None, alias="X-API-Key"),
 ):
     """
@@ -534,6 +1062,28 @@ def agent_pay(
     if agent.api_key != x_api_key:
         raise HTTPException(status_code=403, detail="Invalid API key")
 
+    # A client-supplied tx_hash is recorded once (hot table or archive)
+    if payload.tx_hash and find_receipt(shards, payload.tx_hash):
+        raise HTTPException(status_code=400, detail="tx_hash already recorded")
+
+    # Rate limit + spend cap, checked in memory before any DB write
+    limits = dict(
+        rate_per_minute=agent.rate_limit_per_minute,
+        burst=agent.rate_limit_burst,
+        spend_cap=agent.spend_cap_lovelace,
+        spend_window=agent.spend_window_seconds,
+    )
+    if agent.spend_cap_lovelace and payload.amount_lovelace > agent.spend_cap_lovelace:
+        # no amount of waiting admits this payment, so it is not a 429
+        raise HTTPException(status_code=400, detail="amount exceeds spend cap")
+    retry_after = agent_limiter.check(agent.id, payload.amount_lovelace, **limits)
+    if retry_after is not None:
+        raise HTTPException(
+            status_code=429,
+            detail="Agent rate limit or spend cap exceeded",
+            headers={"Retry-After": str(retry_after)},
+        )
+
     # choose who gets reputation (link agent→address)
     rep_address = agent.reputation_address or agent.owner_address
     if not rep_address:
@@ -546,31 +1096,33 @@ def agent_pay(
     # Mint fake NFT receipt id
     nft_asset_id = fake_mint_nft_receipt(tx_hash)
 
-    # Store PaymentReceipt
-    receipt = PaymentReceipt(
-        tx_hash=tx_hash,
-        payer_address=rep_address,
-        merchant_address=payload.merchant_address,
-        amount_lovelace=payload.amount_lovelace,
-        nft_asset_id=nft_asset_id,
-    )
-    db.add(receipt)
-    db.commit()
-    db.refresh(receipt)
-
-    # Store AgentPayment
-    agent_payment = AgentPayment(
-        agent_id=agent_id,
-        merchant_address=payload.merchant_address,
-        amount_lovelace=payload.amount_lovelace,
-        tx_hash=tx_hash,
-        receipt_nft_asset_id=nft_asset_id,
-    )
-    db.add(agent_payment)
-    db.commit()
+    try:
+        # Store PaymentReceipt (in the merchant's shard when sharded)
+        receipt = new_receipt(
+            tx_hash=tx_hash,
+            payer_address=rep_address,
+            merchant_address=payload.merchant_address,
+            amount_lovelace=payload.amount_lovelace,
+            nft_asset_id=nft_asset_id,
+        )
+        store_row(shards, "tx", tx_hash, payload.merchant_address, receipt)
+
+        # Store AgentPayment
+        agent_payment = AgentPayment(
+            agent_id=agent_id,
+            merchant_address=payload.merchant_address,
+            amount_lovelace=payload.amount_lovelace,
+            tx_hash=tx_hash,
+            receipt_nft_asset_id=nft_asset_id,
+        )
+        store_row(shards, "agent_payment", tx_hash, payload.merchant_address, agent_payment)
+    except Exception:
+        # not recorded: give the request token and spend back
+        agent_limiter.refund(agent.id, payload.amount_lovelace, **limits)
+        raise
 
     # Update reputation for this agent’s reputation address
-    new_score = update_reputation(db, rep_address, delta=1.0)
+    new_score = update_reputation(db, rep_address, delta=1.0, source="agent_payment")
 
     return AgentPayResponse(
         agent_id=agent_id,
@@ -583,15 +1135,17 @@ def agent_pay(
 
 
 @app.get("/api/agents/{agent_id}/payments", response_model=List[AgentPaymentOut])
-def list_agent_payments(agent_id: int, db: Session = Depends(get_db)):
+def list_agent_payments(agent_id: int, shards: ShardSessions = Depends(get_shards)):
     """
     List all payments initiated by a given agent.
     Useful for dashboards and analytics (like DagChain).
     """
-    rows = (
-        db.query(AgentPayment)
+    per_shard = shards.gather(
+        lambda s: s.query(AgentPayment)
         .filter(AgentPayment.agent_id == agent_id)
         .order_by(desc(AgentPayment.id))
         .all()
     )
-    return rows
+    rows = itertools.chain.from_iterable(per_shard)
+    archived = cold_archive.scan("agent_payments", agent_id=agent_id)
+    return merge_with_archived(rows, archived)
@@ -0,0 +1,9 @@
+from main import migrate_all, shard_router
+
+
+if __name__ == "__main__":
+    print("Migrating schema...")
+    migrate_all()
+    if shard_router is not None:
+        print(f"  main database + {len(shard_router)} shard(s)")
+    print("Migration complete.")
@@ -1,20 +1,11 @@
 import os
+import threading
 from typing import Optional
 
 from dotenv import load_dotenv
-from pycardano import (
-    BlockFrostChainContext,
-    PaymentSigningKey,
-    PaymentVerificationKey,
-    Address,
-    TransactionBuilder,
-    TransactionOutput,
-    Network,
-    ScriptPubKey,
-    NativeScript,
-    MultiAsset,
-    Asset,
-)
+
+# pycardano is imported inside RealNftMinter: it is slow to import and
+# only needed when real minting is enabled.
 
 load_dotenv()
 
@@ -42,6 +33,15 @@ class RealNftMinter:
         if not BACKEND_SKEY_HEX or not BACKEND_ADDRESS:
             raise RuntimeError("BACKEND_SKEY_HEX/BACKEND_ADDRESS missing for minter")
 
+        from pycardano import (
+            BlockFrostChainContext,
+            PaymentSigningKey,
+            PaymentVerificationKey,
+            Address,
+            Network,
+            ScriptPubKey,
+        )
+
         self.context = BlockFrostChainContext(
             project_id=BLOCKFROST_PROJECT_ID_PREVIEW,
             base_url="https://cardano-preview.blockfrost.io/api/v0",
@@ -62,6 +62,8 @@ class RealNftMinter:
         Asset name: typically derived from tx_hash or invoice_id.
         Returns: "<policy_id>.<asset_name_hex>"
         """
+        from pycardano import TransactionBuilder, TransactionOutput, MultiAsset
+
         asset_name_bytes = asset_name.encode("utf-8")
         asset_name_hex = asset_name_bytes.hex()
 
@@ -93,6 +95,23 @@ class RealNftMinter:
         return f"{self.policy_id}.{asset_name_hex}"
 
 
+_minter: Optional[RealNftMinter] = None
+_minter_lock = threading.Lock()
+
+
+def get_minter() -> RealNftMinter:
+    """
+    Creates the minter (and its chain context) on first use, then reuses it.
+    A failed construction is not cached, so the next call retries.
+    """
+    global _minter
+    if _minter is None:
+        with _minter_lock:
+            if _minter is None:
+                _minter = RealNftMinter()
+    return _minter
+
+
 def try_mint_receipt_nft(asset_name: str) -> Optional[str]:
     """
     Helper used from main.py:
@@ -103,8 +122,7 @@ def try_mint_receipt_nft(asset_name: str) -> Optional[str]:
         return None
 
     try:
-        minter = RealNftMinter()
-        return minter.mint_receipt_nft(asset_name)
+        return get_minter().mint_receipt_nft(asset_name)
     except Exception as e:
         # in hackathon, log and fall back
         print("[RealNftMinter] Error:", e)
@@ -0,0 +1,168 @@
+import bisect
+import csv
+import threading
+from array import array
+from datetime import datetime, timezone
+from typing import Callable, Iterable, List, Optional, Tuple
+
+LOVELACE_PER_ADA = 1_000_000
+
+# A source returns (unix_seconds, usd_per_ada) points, in any order.
+PriceSource = Callable[[], Iterable[Tuple[float, float]]]
+
+
+def to_unix(dt: datetime) -> float:
+    # DB timestamps are naive UTC (datetime.utcnow)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+class PriceSeries:
+    """
+    Immutable ADA/USD series stored as two parallel float arrays sorted by
+    time. A price lookup is a binary search for the last point at or
+    before the timestamp (earlier timestamps use the first point).
+
+    A point more than `max_age` seconds away from the timestamp is too
+    stale to use (e.g. refreshes have been failing), so the lookup
+    returns None and the receipt is left for backfill_fiat.py.
+    """
+
+    def __init__(self, points: Iterable[Tuple[float, float]], max_age: Optional[float] = None):
+        points = sorted(points)
+        self.times = array("d", (t for t, _ in points))
+        self.prices = array("d", (p for _, p in points))
+        self.max_age = max_age
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def _fresh(self, j: int, ts: float) -> bool:
+        return self.max_age is None or abs(ts - self.times[j]) <= self.max_age
+
+    def price_at(self, ts: float) -> Optional[float]:
+        if not self.times:
+            return None
+        j = max(bisect.bisect_right(self.times, ts) - 1, 0)
+        return self.prices[j] if self._fresh(j, ts) else None
+
+    def prices_at(self, timestamps: List[float]) -> List[Optional[float]]:
+        """
+        Bulk lookup: sorts the queries once and walks the series in a
+        single pass instead of one binary search per timestamp.
+        """
+        if not self.times:
+            return [None] * len(timestamps)
+
+        out: List[Optional[float]] = [None] * len(timestamps)
+        order = sorted(range(len(timestamps)), key=timestamps.__getitem__)
+        times, prices = self.times, self.prices
+        j, last = 0, len(times) - 1
+        for i in order:
+            ts = timestamps[i]
+            while j < last and times[j + 1] <= ts:
+                j += 1
+            if self._fresh(j, ts):
+                out[i] = prices[j]
+        return out
+
+
+def file_price_source(path: str) -> PriceSource:
+    """
+    CSV file with `timestamp,usd` rows; timestamp is unix seconds or ISO-8601.
+    """
+
+    def load():
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.reader(f):
+                if not row or row[0].startswith("#") or row[0] == "timestamp":
+                    continue
+                ts, usd = row[0].strip(), float(row[1])
+                try:
+                    yield float(ts), usd
+                except ValueError:
+                    yield to_unix(datetime.fromisoformat(ts)), usd
+
+    return load
+
+
+def http_price_source(url: str) -> PriceSource:
+    """
+    JSON endpoint in CoinGecko market_chart shape:
+      {"prices": [[unix_millis, usd], ...]}
+    """
+
+    def load():
+        import requests  # only needed for http sources
+
+        r = requests.get(url, timeout=20)
+        r.raise_for_status()
+        return [(ms / 1000.0, usd) for ms, usd in r.json()["prices"]]
+
+    return load
+
+
+def source_from_env(value: Optional[str]) -> Optional[PriceSource]:
+    if not value:
+        return None
+    if value.startswith(("http://", "https://")):
+        return http_price_source(value)
+    return file_price_source(value)
+
+
+class PriceFeed:
+    """
+    Holds the current PriceSeries and refreshes it from `source` on a
+    background thread (the first load too, so startup never waits on
+    the source). Reads never block on the source: they use whatever
+    series was last loaded, and prices older than `max_age_seconds`
+    count as missing.
+    """
+
+    def __init__(
+        self,
+        source: Optional[PriceSource],
+        refresh_seconds: float = 300.0,
+        max_age_seconds: Optional[float] = 86400.0,
+    ):
+        self.source = source
+        self.refresh_seconds = refresh_seconds
+        self.max_age_seconds = max_age_seconds
+        self.series = PriceSeries([], max_age_seconds)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def refresh(self) -> None:
+        if self.source is None:
+            return
+        try:
+            series = PriceSeries(self.source(), self.max_age_seconds)
+        except Exception as e:
+            # keep serving the previous series
+            print("[PriceFeed] refresh failed:", e)
+            return
+        self.series = series  # atomic swap
+
+    def start(self) -> None:
+        if self.source is None or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="price-feed", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread = None
+
+    def _run(self) -> None:
+        self.refresh()
+        while not self._stop.wait(self.refresh_seconds):
+            self.refresh()
+
+    def value_usd(self, amount_lovelace: int, at: datetime) -> Optional[float]:
+        price = self.series.price_at(to_unix(at))
+        if price is None:
+            return None
+        return amount_lovelace / LOVELACE_PER_ADA * price
+
@@ -0,0 +1,217 @@
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import and_, delete, or_, select, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from batch_writer import BatchWriter
+
+
+class ReputationLedger:
+    """
+    Time-decayed reputation over an append-only event log.
+
+    Events are buffered by `events` (a BatchWriter that stamps written_at
+    at each write attempt) and folded lazily into one snapshot row per
+    address: score as of anchor_at, plus rank_key (the score normalised to
+    `epoch`) so a single ORDER BY ranks everyone by current score.
+
+    The snapshot's fold watermark is (folded_at, last_event_id) in
+    (written_at, id) order. Only events written at least `fold_lag`
+    seconds ago are folded into it: concurrent batches (e.g. several
+    workers on Oracle) can commit out of id order, but a batch stamped
+    before now - fold_lag has committed by now, so nothing lands behind
+    the watermark. Newer events are applied on read but not persisted.
+    """
+
+    def __init__(
+        self,
+        events: BatchWriter,
+        event_model,
+        snapshot_model,
+        half_life_days: float = 180.0,
+        epoch: datetime = datetime(2025, 1, 1),
+        fold_lag_seconds: float = 60.0,
+    ):
+        self.events = events
+        self.Event = event_model
+        self.Snapshot = snapshot_model
+        self.half_life_days = half_life_days
+        self.epoch = epoch
+        self.fold_lag = timedelta(seconds=fold_lag_seconds)
+
+    # ---------- decay ----------
+
+    def decay_factor(self, elapsed: timedelta) -> float:
+        if self.half_life_days <= 0:
+            return 1.0
+        return 0.5 ** (elapsed.total_seconds() / (self.half_life_days * 86400))
+
+    def fold_events(self, score: float, anchor: Optional[datetime], events):
+        """
+        Folds (delta, created_at) events into a (score, anchor) pair,
+        decaying the running score to each event's time.
+        """
+        for delta, at in events:
+            if anchor is None:
+                score, anchor = score + delta, at
+            elif at >= anchor:
+                score, anchor = score * self.decay_factor(at - anchor) + delta, at
+            else:
+                score += delta * self.decay_factor(anchor - at)
+        return score, anchor
+
+    def snapshot(self, score: float, anchor_at: Optional[datetime] = None) -> dict:
+        """Column values for a snapshot row holding `score` at anchor_at."""
+        anchor_at = anchor_at or datetime.utcnow()
+        return {
+            "score": score,
+            "anchor_at": anchor_at,
+            "rank_key": score / self.decay_factor(anchor_at - self.epoch),
+        }
+
+    def decayed(self, score: float, anchor: Optional[datetime], now: datetime) -> float:
+        if anchor is None or now <= anchor:
+            return score
+        return score * self.decay_factor(now - anchor)
+
+    # ---------- folding ----------
+
+    def _after_watermark(self, rep):
+        E = self.Event
+        last_id = (rep.last_event_id or 0) if rep else 0
+        if rep is None or rep.folded_at is None:
+            # fresh row, or a snapshot written before the watermark had a time
+            return E.id > last_id
+        return or_(
+            E.written_at > rep.folded_at,
+            and_(E.written_at == rep.folded_at, E.id > last_id),
+        )
+
+    def fold(self, db: Session, address: str):
+        """
+        Folds settled DB events past the snapshot's watermark and writes
+        the new snapshot back. Returns (score, anchor) including the
+        events too recent to fold.
+        """
+        E = self.Event
+        rep = db.query(self.Snapshot).filter(self.Snapshot.address == address).first()
+        events = (
+            db.query(E.id, E.delta, E.created_at, E.written_at)
+            .filter(E.address == address, self._after_watermark(rep))
+            .order_by(E.written_at, E.id)
+            .all()
+        )
+        score = rep.score if rep else 0.0
+        anchor = rep.anchor_at if rep else None
+        if not events:
+            return score, anchor
+
+        settled_before = datetime.utcnow() - self.fold_lag
+        n_settled = 0
+        while n_settled < len(events) and events[n_settled].written_at <= settled_before:
+            n_settled += 1
+        settled, recent = events[:n_settled], events[n_settled:]
+
+        score, anchor = self.fold_events(score, anchor, ((e.delta, e.created_at) for e in settled))
+        if settled:
+            if rep is None:
+                rep = self.Snapshot(address=address)
+                db.add(rep)
+            for column, value in self.snapshot(score, anchor).items():
+                setattr(rep, column, value)
+            rep.folded_at = settled[-1].written_at
+            rep.last_event_id = settled[-1].id
+            try:
+                db.commit()
+            except IntegrityError:
+                # another request created the row first; the cache is best-effort
+                db.rollback()
+        return self.fold_events(score, anchor, ((e.delta, e.created_at) for e in recent))
+
+    def current(self, db: Session, address: str) -> float:
+        """
+        Current decayed score: snapshot + unfolded DB events + events
+        still buffered in this process.
+        """
+        (score, anchor), pending = self.events.read_consistent(
+            lambda: self.fold(db, address),
+            lambda e: e["address"] == address,
+        )
+        score, anchor = self.fold_events(score, anchor, ((e["delta"], e["created_at"]) for e in pending))
+        return self.decayed(score, anchor, datetime.utcnow())
+
+    def record(self, db: Session, address: str, delta: float, source: str) -> float:
+        """Appends an event and returns the address's current score."""
+        self.events.add(
+            {
+                "address": address,
+                "delta": delta,
+                "source": source,
+                "created_at": datetime.utcnow(),
+            }
+        )
+        return self.current(db, address)
+
+    # ---------- maintenance ----------
+
+    def migrate(self, bind: Engine) -> None:
+        """
+        Events logged before written_at existed count as written when
+        created; legacy snapshot rows (no anchor) are anchored now so they
+        rank by their score instead of sorting last.
+        """
+        ev = self.Event.__table__
+        with bind.begin() as conn:
+            conn.execute(
+                update(ev).where(ev.c.written_at.is_(None)).values(written_at=ev.c.created_at)
+            )
+        with Session(bind) as db:
+            self._anchor_legacy(db)
+            db.commit()
+
+    def _anchor_legacy(self, db: Session) -> int:
+        unanchored = db.query(self.Snapshot).filter(self.Snapshot.anchor_at.is_(None)).all()
+        for rep in unanchored:
+            for column, value in self.snapshot(rep.score or 0.0).items():
+                setattr(rep, column, value)
+        return len(unanchored)
+
+    def compact(self, db: Session, retain_days: int = 30) -> dict:
+        """
+        Snapshots every address with unfolded events (and legacy rows
+        without an anchor), then prunes folded events older than retain_days.
+        """
+        self.events.flush()
+
+        ev = self.Event.__table__
+        ur = self.Snapshot.__table__
+        stale = (
+            select(ev.c.address)
+            .outerjoin(ur, ur.c.address == ev.c.address)
+            .where(
+                ur.c.id.is_(None)
+                | ur.c.folded_at.is_(None)
+                | (ev.c.written_at > ur.c.folded_at)
+            )
+            .distinct()
+        )
+        addresses = [a for (a,) in db.execute(stale)]
+        for address in addresses:
+            self.fold(db, address)
+
+        anchored = self._anchor_legacy(db)
+        db.commit()
+
+        cutoff = datetime.utcnow() - timedelta(days=retain_days)
+        folded_until = (
+            select(ur.c.folded_at).where(ur.c.address == ev.c.address).scalar_subquery()
+        )
+        pruned = db.execute(
+            delete(ev).where(ev.c.written_at < cutoff, ev.c.written_at < folded_until)
+        ).rowcount
+        db.commit()
+
+        return {"folded": len(addresses), "anchored": anchored, "pruned": pruned}
@@ -0,0 +1,144 @@
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+# SQLite FTS5 index over invoice_nfts, kept in sync by triggers so index
+# updates commit in the same transaction as the invoice row itself.
+# merchant_address and status are indexed too, so a merchant's filtered
+# search is a single MATCH walked in rowid (= invoice id) order. The
+# merchant is indexed as hex(merchant_address): one token, so the filter
+# is an exact match (the plain address would be split on '_' and the
+# phrase "addr_test1_m" would also match "addr_test1_m_other"). The index
+# is contentless because that column is not in invoice_nfts.
+INVOICE_SEARCH_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS invoice_search USING fts5(
+        invoice_id, description, merchant_key, status,
+        content='', prefix='2 3 4'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS invoice_search_ai AFTER INSERT ON invoice_nfts BEGIN
+        INSERT INTO invoice_search(rowid, invoice_id, description, merchant_key, status)
+        VALUES (new.id, new.invoice_id, new.description, hex(new.merchant_address), new.status);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS invoice_search_ad AFTER DELETE ON invoice_nfts BEGIN
+        INSERT INTO invoice_search(invoice_search, rowid, invoice_id, description, merchant_key, status)
+        VALUES ('delete', old.id, old.invoice_id, old.description, hex(old.merchant_address), old.status);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS invoice_search_au AFTER UPDATE ON invoice_nfts BEGIN
+        INSERT INTO invoice_search(invoice_search, rowid, invoice_id, description, merchant_key, status)
+        VALUES ('delete', old.id, old.invoice_id, old.description, hex(old.merchant_address), old.status);
+        INSERT INTO invoice_search(rowid, invoice_id, description, merchant_key, status)
+        VALUES (new.id, new.invoice_id, new.description, hex(new.merchant_address), new.status);
+    END
+    """,
+]
+
+REBUILD_INVOICE_SEARCH = [
+    "INSERT INTO invoice_search(invoice_search) VALUES ('delete-all')",
+    """
+    INSERT INTO invoice_search(rowid, invoice_id, description, merchant_key, status)
+    SELECT id, invoice_id, description, hex(merchant_address), status FROM invoice_nfts
+    """,
+]
+
+
+def supports_fts(bind) -> bool:
+    return bind.dialect.name == "sqlite"
+
+
+def ensure_invoice_search(bind: Engine, rebuild: bool = False) -> None:
+    """
+    Creates the FTS index + triggers if missing. A newly created index (or
+    rebuild=True, e.g. after a bulk load without triggers) is filled from
+    invoice_nfts.
+    """
+    if not supports_fts(bind):
+        return
+    with bind.begin() as conn:
+        existed = conn.execute(
+            text("SELECT sql FROM sqlite_master WHERE name = 'invoice_search'")
+        ).scalar()
+        if existed and "merchant_key" not in existed:
+            # index from before the exact merchant token: replace it
+            _drop(conn)
+            existed = None
+        for ddl in INVOICE_SEARCH_DDL:
+            conn.exec_driver_sql(ddl)
+        if rebuild or not existed:
+            for sql in REBUILD_INVOICE_SEARCH:
+                conn.exec_driver_sql(sql)
+
+
+def drop_invoice_search(bind: Engine) -> None:
+    """Drops the index (its triggers go with invoice_nfts or explicitly here)."""
+    if not supports_fts(bind):
+        return
+    with bind.begin() as conn:
+        _drop(conn)
+
+
+def _drop(conn) -> None:
+    for trigger in ("invoice_search_ai", "invoice_search_ad", "invoice_search_au"):
+        conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {trigger}")
+    conn.exec_driver_sql("DROP TABLE IF EXISTS invoice_search")
+
+
+def _phrase(value: str) -> str:
+    return '"' + value.replace('"', '""') + '"'
+
+
+def fts_query(
+    q: str, merchant_address: Optional[str] = None, status: Optional[str] = None
+) -> Optional[str]:
+    """
+    Builds an FTS5 MATCH expression: every whitespace-separated term must
+    prefix-match a token of invoice_id or description (so "INV-00" and
+    "consult" both work), optionally narrowed to a merchant and status.
+    """
+    terms = [_phrase(t) + "*" for t in q.split()]
+    if not terms:
+        return None
+    parts = ["{invoice_id description} : (" + " AND ".join(terms) + ")"]
+    if merchant_address:
+        parts.append("merchant_key : " + _phrase(merchant_address.encode("utf-8").hex().upper()))
+    if status:
+        parts.append("status : " + _phrase(status))
+    return " AND ".join(parts)
+
+
+def search_invoice_ids(
+    db: Session,
+    q: str,
+    merchant_address: Optional[str],
+    status: Optional[str],
+    before_id: Optional[int],
+    limit: int,
+) -> List[int]:
+    """Matching invoice ids, newest first, below before_id (keyset paging)."""
+    match = fts_query(q, merchant_address, status)
+    if match is None:
+        return []
+    sql = "SELECT rowid FROM invoice_search WHERE invoice_search MATCH :match"
+    params = {"match": match, "limit": limit}
+    if before_id is not None:
+        sql += " AND rowid < :before_id"
+        params["before_id"] = before_id
+    sql += " ORDER BY rowid DESC LIMIT :limit"
+    return [row[0] for row in db.execute(text(sql), params)]
+
+
+def prefix_filter(column, prefix: str):
+    """
+    `column LIKE 'prefix%'` written as a range, so the column's B-tree
+    index is used on every backend regardless of LIKE collation rules.
+    """
+    return (column >= prefix) & (column < prefix + "\U0010ffff")
+
@@ -7,14 +7,18 @@ from main import (
     InvoiceNFT,
     Agent,
     AgentPayment,
+    reputation,
 )
+from search import drop_invoice_search, ensure_invoice_search
 
 
 def reset_and_seed():
     print("Dropping existing tables...")
+    drop_invoice_search(engine)
     Base.metadata.drop_all(bind=engine)
     print("Creating tables...")
     Base.metadata.create_all(bind=engine)
+    ensure_invoice_search(engine)
 
     db = SessionLocal()
 
@@ -25,9 +29,9 @@ def reset_and_seed():
         merchant1 = "addr_test1_demo_merchant1xxxxxxxxxxxxxxxxxxxxxx"
 
         # Seed reputations
-        rep1 = UserReputation(address=payer1, score=3.0)
-        rep2 = UserReputation(address=payer2, score=1.0)
-        repm = UserReputation(address=merchant1, score=5.0)
+        rep1 = UserReputation(address=payer1, **reputation.snapshot(3.0))
+        rep2 = UserReputation(address=payer2, **reputation.snapshot(1.0))
+        repm = UserReputation(address=merchant1, **reputation.snapshot(5.0))
 
         db.add_all([rep1, rep2, repm])
         db.commit()
@@ -0,0 +1,327 @@
+import argparse
+import itertools
+import math
+import random
+import secrets
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import Date, cast, func, insert, literal, select, union_all
+
+from main import (
+    Base,
+    engine,
+    shard_router,
+    migrate_schema,
+    reputation,
+    UserReputation,
+    PaymentReceipt,
+    InvoiceNFT,
+    Agent,
+    AgentPayment,
+)
+from search import drop_invoice_search, ensure_invoice_search
+
+BULK_TABLES = [
+    PaymentReceipt.__table__,
+    InvoiceNFT.__table__,
+    AgentPayment.__table__,
+]
+
+# Relaxed durability for the load only; the previous values are restored.
+LOAD_PRAGMAS = {
+    "journal_mode": "OFF",
+    "synchronous": "OFF",
+    "temp_store": "MEMORY",
+    "cache_size": "-262144",  # 256 MiB
+}
+
+DESCRIPTIONS = [
+    "Monthly SaaS subscription",
+    "Consulting service",
+    "Coffee beans wholesale",
+    "Cloud hosting",
+    "Design retainer",
+    "Event tickets",
+    "Hardware wallet order",
+    "Translation services",
+    "Annual support plan",
+    "Staking workshop",
+]
+
+
+def zipf_cum_weights(n: int, s: float):
+    """Cumulative Zipf weights 1/k^s, for random.choices(cum_weights=...)."""
+    return list(itertools.accumulate(1.0 / (k ** s) for k in range(1, n + 1)))
+
+
+def relax_sqlite(conn) -> dict:
+    if conn.dialect.name != "sqlite":
+        return {}
+    previous = {}
+    for name, value in LOAD_PRAGMAS.items():
+        previous[name] = conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+        conn.exec_driver_sql(f"PRAGMA {name} = {value}")
+    return previous
+
+
+def restore_sqlite(conn, previous: dict) -> None:
+    for name, value in previous.items():
+        conn.exec_driver_sql(f"PRAGMA {name} = {value}")
+
+
+def bulk_insert(conn, table, rows, batch_size: int, after_batch=None) -> int:
+    """Core executemany inserts, one commit per batch."""
+    total = 0
+    stmt = insert(table)
+    for batch in iter(lambda: list(itertools.islice(rows, batch_size)), []):
+        conn.execute(stmt, batch)
+        if after_batch is not None:
+            after_batch(conn)
+        conn.commit()
+        total += len(batch)
+        if total % (batch_size * 20) == 0:
+            print(f"    {table.name}: {total:,} rows")
+    return total
+
+
+def generate(args) -> None:
+    rng = random.Random(args.seed)
+
+    merchants = [f"addr_test1_gen_merchant{i:07d}" for i in range(args.merchants)]
+    payers = [f"addr_test1_gen_payer{i:08d}" for i in range(args.payers)]
+    merchant_weights = zipf_cum_weights(len(merchants), args.zipf_s)
+
+    def pick_merchants(k):
+        return rng.choices(merchants, cum_weights=merchant_weights, k=k)
+
+    end = datetime.utcnow()
+    start = end - timedelta(days=args.days)
+    span = (end - start).total_seconds()
+
+    agents = [
+        {
+            "id": i + 1,
+            "name": f"gen-agent-{i}",
+            "api_key": secrets.token_hex(32),
+            "owner_address": rng.choice(payers),
+            "reputation_address": f"addr_test1_gen_agent{i:06d}",
+        }
+        for i in range(args.agents)
+    ]
+    agent_payments = []
+    n_agent = 0
+
+    def flush_agent_payments(conn):
+        # agent payments are generated alongside their receipts
+        nonlocal n_agent
+        if agent_payments:
+            conn.execute(insert(AgentPayment.__table__), agent_payments)
+            n_agent += len(agent_payments)
+            agent_payments.clear()
+
+    def receipts():
+        chunk = 10_000
+        for offset in range(0, args.receipts, chunk):
+            n = min(chunk, args.receipts - offset)
+            for j, merchant in enumerate(pick_merchants(n)):
+                i = offset + j
+                created_at = start + timedelta(seconds=span * i / args.receipts)
+                amount = int(rng.lognormvariate(14.0, 1.0))
+                if agents and rng.random() < args.agent_ratio:
+                    agent = rng.choice(agents)
+                    payer = agent["reputation_address"]
+                    tx_hash = f"agent-{agent['id']}-tx-{i:016x}"
+                    nft_asset_id = "f" * 56 + "." + tx_hash[:16]
+                    agent_payments.append(
+                        {
+                            "agent_id": agent["id"],
+                            "merchant_address": merchant,
+                            "amount_lovelace": amount,
+                            "tx_hash": tx_hash,
+                            "receipt_nft_asset_id": nft_asset_id,
+                            "created_at": created_at,
+                        }
+                    )
+                else:
+                    payer = payers[rng.randrange(len(payers))]
+                    tx_hash = f"{rng.getrandbits(192):048x}{i:016x}"
+                    nft_asset_id = "f" * 56 + "." + tx_hash[:16]
+                yield {
+                    "tx_hash": tx_hash,
+                    "payer_address": payer,
+                    "merchant_address": merchant,
+                    "amount_lovelace": amount,
+                    "nft_asset_id": nft_asset_id,
+                    "created_at": created_at,
+                }
+
+    def invoices():
+        chunk = 10_000
+        for offset in range(0, args.invoices, chunk):
+            n = min(chunk, args.invoices - offset)
+            for j, merchant in enumerate(pick_merchants(n)):
+                i = offset + j
+                invoice_id = f"INV-{i:09d}"
+                yield {
+                    "invoice_id": invoice_id,
+                    "merchant_address": merchant,
+                    "customer_address": payers[rng.randrange(len(payers))],
+                    "amount_lovelace": int(rng.lognormvariate(14.5, 0.8)),
+                    "description": rng.choice(DESCRIPTIONS),
+                    "status": "paid" if rng.random() < args.paid_ratio else "pending",
+                    "nft_asset_id": "e" * 56 + "." + invoice_id.encode("utf-8").hex()[:16],
+                }
+
+    print("Dropping existing tables...")
+    drop_invoice_search(engine)
+    Base.metadata.drop_all(bind=engine)
+    print("Creating tables...")
+    migrate_schema()
+
+    with engine.connect() as conn:
+        previous = relax_sqlite(conn)
+        try:
+            # secondary indexes are rebuilt once at the end instead of
+            # being maintained row by row during the load
+            for table in BULK_TABLES:
+                for index in table.indexes:
+                    index.drop(conn)
+            conn.commit()
+
+            t0 = time.perf_counter()
+            if agents:
+                conn.execute(insert(Agent.__table__), agents)
+                conn.commit()
+
+            print("  loading payment_receipts + agent_payments...")
+            n_receipts = bulk_insert(
+                conn,
+                PaymentReceipt.__table__,
+                receipts(),
+                args.batch_size,
+                after_batch=flush_agent_payments,
+            )
+            print("  loading invoice_nfts...")
+            n_invoices = bulk_insert(conn, InvoiceNFT.__table__, invoices(), args.batch_size)
+            t_load = time.perf_counter() - t0
+
+            print("  building indexes...")
+            for table in BULK_TABLES:
+                for index in table.indexes:
+                    index.create(conn)
+            conn.commit()
+
+            print("  computing user_reputation...")
+            conn.execute(reputation_from_history(conn, end, args.days, n_invoices))
+            conn.commit()
+        finally:
+            restore_sqlite(conn, previous)
+
+    # the invoice search index is built once from the loaded rows
+    print("  building invoice search index...")
+    ensure_invoice_search(engine, rebuild=True)
+
+    total = time.perf_counter() - t0
+    print("Generation complete.")
+    print(f"  receipts:       {n_receipts:,} ({n_receipts / t_load:,.0f} rows/s load)")
+    print(f"  agent payments: {n_agent:,}")
+    print(f"  invoices:       {n_invoices:,}")
+    print(f"  merchants={args.merchants:,} payers={args.payers:,} agents={args.agents:,}")
+    print(f"  total time:     {total:.1f}s")
+
+
+def age_days(conn, column, anchor: datetime):
+    """Days from `column` (a timestamp) to anchor, as a SQL expression."""
+    if conn.dialect.name == "sqlite":
+        return func.julianday(anchor.isoformat(sep=" ")) - func.julianday(column)
+    # Oracle: DATE - DATE is a number of days
+    return cast(literal(anchor), Date) - cast(column, Date)
+
+
+def ensure_sqlite_power(conn) -> None:
+    # SQLite builds without math functions lack power()
+    if conn.dialect.name != "sqlite":
+        return
+    try:
+        conn.exec_driver_sql("SELECT power(0.5, 1.0)")
+    except Exception:
+        conn.connection.driver_connection.create_function(
+            "power", 2, math.pow, deterministic=True
+        )
+
+
+def reputation_from_history(conn, anchor: datetime, days: int, n_invoices: int):
+    """
+    Rebuilds user_reputation in one INSERT ... SELECT, with the same
+    weights as the API (payer +1 per receipt, merchant +2 and customer +1
+    per paid invoice), each delta decayed from its time to `anchor` like
+    the reputation ledger would (no events to fold afterwards).
+
+    Invoices carry no timestamp; the generator spreads them evenly over
+    the history in id order, so their age is derived from the id.
+    """
+    half_life = reputation.half_life_days
+    snapshot = reputation.snapshot(1.0, anchor)
+    rank_factor = snapshot["rank_key"]
+
+    def weight(age):
+        if half_life <= 0:
+            return literal(1.0)
+        return func.power(0.5, age / half_life)
+
+    ensure_sqlite_power(conn)
+    r = PaymentReceipt.__table__
+    i = InvoiceNFT.__table__
+    invoice_age = (n_invoices - i.c.id + 1) * (float(days) / max(n_invoices, 1))
+    deltas = union_all(
+        select(
+            r.c.payer_address.label("address"),
+            weight(age_days(conn, r.c.created_at, anchor)).label("delta"),
+        ),
+        select(i.c.merchant_address, 2.0 * weight(invoice_age)).where(i.c.status == "paid"),
+        select(i.c.customer_address, weight(invoice_age)).where(
+            i.c.status == "paid", i.c.customer_address.isnot(None)
+        ),
+    ).subquery()
+    total = func.sum(deltas.c.delta)
+    return insert(UserReputation.__table__).from_select(
+        ["address", "score", "anchor_at", "last_event_id", "rank_key"],
+        select(
+            deltas.c.address,
+            total,
+            literal(anchor),
+            literal(0),
+            total * rank_factor,
+        ).group_by(deltas.c.address),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate a large synthetic dataset (drops existing tables)."
+    )
+    parser.add_argument("--merchants", type=int, default=10_000)
+    parser.add_argument("--payers", type=int, default=1_000_000)
+    parser.add_argument("--agents", type=int, default=500)
+    parser.add_argument("--receipts", type=int, default=1_000_000)
+    parser.add_argument("--invoices", type=int, default=200_000)
+    parser.add_argument("--zipf-s", type=float, default=1.1, help="merchant popularity skew")
+    parser.add_argument("--paid-ratio", type=float, default=0.7)
+    parser.add_argument("--agent-ratio", type=float, default=0.1,
+                        help="share of receipts paid through an agent")
+    parser.add_argument("--days", type=int, default=365, help="history span")
+    parser.add_argument("--batch-size", type=int, default=50_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if shard_router is not None:
+        parser.error("seed_large.py loads a single database; unset SHARD_DATABASE_URLS")
+    if args.merchants < 1 or args.payers < 1:
+        parser.error("need at least one merchant and one payer")
+
+    generate(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import bisect
+import hashlib
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, TypeVar
+
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+
+T = TypeVar("T")
+
+VNODES_PER_SHARD = 64
+# Global ids of sharded rows are ms_since_ID_EPOCH * SHARD_ID_STRIDE + the
+# directory shard: time-ordered across shards (so "newest first" and id
+# keyset paging keep working), unique per directory shard via the
+# directory's primary key, and below 2**53 (exact in JSON / JavaScript)
+# for the next ~270 years. N can grow up to SHARD_ID_STRIDE.
+SHARD_ID_STRIDE = 1024
+ID_EPOCH_MS = 1735689600000  # 2025-01-01T00:00:00Z
+
+
+def _ring_hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
+
+
+class ShardRouter:
+    """
+    Routes merchant-scoped rows to one of N engines with a consistent hash
+    ring over merchant_address (virtual nodes keep the spread even).
+
+    Local example with three SQLite files:
+      SHARD_DATABASE_URLS=sqlite:///./shard0.db,sqlite:///./shard1.db,sqlite:///./shard2.db
+    """
+
+    def __init__(self, engines: List[Engine], vnodes: int = VNODES_PER_SHARD):
+        if not engines:
+            raise ValueError("ShardRouter needs at least one engine")
+        if len(engines) > SHARD_ID_STRIDE:
+            raise ValueError(f"ShardRouter supports at most {SHARD_ID_STRIDE} shards")
+
+        self.engines = engines
+        self.sessionmakers = [
+            sessionmaker(autocommit=False, autoflush=False, bind=e) for e in engines
+        ]
+
+        ring = sorted(
+            (_ring_hash(f"shard-{i}#{v}"), i)
+            for i in range(len(engines))
+            for v in range(vnodes)
+        )
+        self._ring_keys = [h for h, _ in ring]
+        self._ring_shards = [i for _, i in ring]
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=len(engines), thread_name_prefix="shard"
+        )
+        self._id_lock = threading.Lock()
+        self._last_ms: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.engines)
+
+    def shard_for(self, key: str) -> int:
+        """Shard owning `key` (a merchant_address, or a directory key)."""
+        i = bisect.bisect(self._ring_keys, _ring_hash(key))
+        return self._ring_shards[i % len(self._ring_shards)]
+
+    def next_id(self, shard: int, collided: bool = False) -> int:
+        """
+        A new global id claimed in `shard`'s directory. Strictly increasing
+        per shard within this process; another process can pick the same
+        millisecond, which the directory's primary key rejects. Callers
+        then ask again with collided=True, which skips a few random
+        milliseconds so the processes stop stepping in lockstep.
+        """
+        with self._id_lock:
+            ms = int(time.time() * 1000) - ID_EPOCH_MS
+            ms = max(ms, self._last_ms.get(shard, -1) + 1)
+            if collided:
+                ms += random.randint(1, 16)
+            self._last_ms[shard] = ms
+        return ms * SHARD_ID_STRIDE + shard
+
+    @staticmethod
+    def id_time(global_id: int) -> float:
+        """Unix time a global id was handed out (ids from before were small)."""
+        return (global_id // SHARD_ID_STRIDE + ID_EPOCH_MS) / 1000
+
+    def gather(self, fn: Callable[[Session], T]) -> List[T]:
+        """
+        Runs fn against every shard in parallel, each with its own session.
+        """
+        futures = [self._executor.submit(self._run, sm, fn) for sm in self.sessionmakers]
+        return [f.result() for f in futures]
+
+    @staticmethod
+    def _run(make_session: sessionmaker, fn: Callable[[Session], T]) -> T:
+        db = make_session()
+        try:
+            return fn(db)
+        finally:
+            db.close()
+
+
+class ShardSessions:
+    """
+    Per-request view over the shards. Shard sessions are opened lazily and
+    closed together; without a router every call falls back to `db`.
+    """
+
+    def __init__(self, router: Optional[ShardRouter], db: Session):
+        self.router = router
+        self.db = db
+        self._open: Dict[int, Session] = {}
+
+    @property
+    def sharded(self) -> bool:
+        return self.router is not None
+
+    def for_shard(self, shard: int) -> Session:
+        if self.router is None:
+            return self.db
+        if shard not in self._open:
+            self._open[shard] = self.router.sessionmakers[shard]()
+        return self._open[shard]
+
+    def for_merchant(self, merchant_address: str) -> Session:
+        if self.router is None:
+            return self.db
+        return self.for_shard(self.router.shard_for(merchant_address))
+
+    def gather(self, fn: Callable[[Session], T]) -> List[T]:
+        if self.router is None:
+            return [fn(self.db)]
+        return self.router.gather(fn)
+
+    def close(self) -> None:
+        for session in self._open.values():
+            session.close()
+        self._open.clear()
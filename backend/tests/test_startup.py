@@ -0,0 +1,57 @@
+import os
+import statistics
+import subprocess
+import sys
+
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+import bench_startup  # noqa: E402
+
+RUNS = 3
+
+
+@pytest.fixture(autouse=True)
+def blockfrost_env(monkeypatch):
+    # main refuses to import without it; the budget runs never call out
+    monkeypatch.setenv("BLOCKFROST_PROJECT_ID_PREVIEW", os.getenv("BLOCKFROST_PROJECT_ID_PREVIEW", "test"))
+
+
+def test_import_within_budget():
+    import_ms = statistics.median(bench_startup.import_profile()[0] for _ in range(RUNS))
+    assert import_ms <= bench_startup.IMPORT_BUDGET_MS, (
+        f"import main took {import_ms:.0f} ms (budget {bench_startup.IMPORT_BUDGET_MS:.0f} ms)"
+    )
+
+
+def test_first_request_within_budget():
+    first_ms = statistics.median(bench_startup.time_to_first_request_ms() for _ in range(RUNS))
+    assert first_ms <= bench_startup.FIRST_REQUEST_BUDGET_MS, (
+        f"first request took {first_ms:.0f} ms "
+        f"(budget {bench_startup.FIRST_REQUEST_BUDGET_MS:.0f} ms)"
+    )
+
+
+def test_first_request_runs_startup():
+    # an unmigrated database only fails in startup(), so this proves the
+    # timed path includes it
+    with pytest.raises(subprocess.CalledProcessError) as excinfo:
+        bench_startup.time_to_first_request_ms(migrate=False)
+    assert "schema is out of date" in excinfo.value.stderr
+
+
+def test_heavy_modules_stay_lazy():
+    proc = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, main; print(' '.join(m for m in ('pycardano', 'requests') if m in sys.modules))",
+        ],
+        cwd=BACKEND,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert proc.stdout.strip() == "", f"imported at startup: {proc.stdout.strip()}"